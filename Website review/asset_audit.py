@@ -0,0 +1,202 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+from scraper import DEFAULT_HEADERS, make_session
+
+# Sub-resource audit: probes every image, stylesheet, script and font the
+# page references (HEAD, falling back to a one-byte ranged GET) over a shared
+# connection pool, and turns the responses into page-weight, compression,
+# caching, image-format and security-header metrics for calculate_scores.
+
+TEXT_TYPES = ('stylesheet', 'script')
+COMPRESSED_ENCODINGS = ('gzip', 'br', 'zstd', 'deflate')
+MODERN_IMAGE_FORMATS = ('webp', 'avif', 'svg')
+IMAGE_SIZE_BUCKETS = ((10 * 1024, '<10KB'), (100 * 1024, '10-100KB'), (500 * 1024, '100-500KB'), (None, '>500KB'))
+PROBE_HEADERS = {**DEFAULT_HEADERS, 'Accept-Encoding': 'gzip, deflate, br'}
+
+
+# Function to list the page's sub-resources as absolute, de-duplicated URLs
+def collect_assets(site_data, max_assets=500):
+    base = site_data.get('final_url') or site_data['url']
+    refs = [(img['src'], 'image') for img in site_data['images']]
+    refs += [(asset['url'], asset['type']) for asset in site_data.get('assets', [])]
+    seen = set()
+    assets = []
+    for ref, kind in refs:
+        url = urljoin(base, ref.strip())
+        if urlsplit(url).scheme not in ('http', 'https') or url in seen:
+            continue
+        seen.add(url)
+        assets.append({'url': url, 'type': kind})
+        if len(assets) >= max_assets:
+            break
+    return assets
+
+# Function to read the total size from a Content-Range or Content-Length header
+def response_size(response):
+    content_range = response.headers.get('Content-Range', '')
+    match = re.search(r'/(\d+)$', content_range)
+    if match:
+        return int(match.group(1))
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+# Function to fetch the headers for one asset without downloading its body
+def probe_asset(session, asset, timeout=5):
+    result = dict(asset, status=None, bytes=None, content_type=None, content_encoding=None, cache_control=None, error=None)
+    head = ranged = None
+    try:
+        head = session.head(asset['url'], headers=PROBE_HEADERS, timeout=timeout, allow_redirects=True)
+        if head.status_code >= 400 or response_size(head) is None:
+            # Some servers reject HEAD or omit the length; ask for one byte instead
+            ranged = session.get(
+                asset['url'], headers={**PROBE_HEADERS, 'Range': 'bytes=0-0'},
+                timeout=timeout, allow_redirects=True, stream=True,
+            )
+            ranged.close()
+    except Exception as e:
+        if head is None:
+            result['error'] = str(e)
+            return result
+    # A successful HEAD describes the full response; ranged replies often
+    # leave out Content-Encoding, so the GET only fills in the size (or
+    # everything, when HEAD itself failed)
+    response = head if head.status_code < 400 or ranged is None else ranged
+    result['status'] = response.status_code
+    result['bytes'] = response_size(response)
+    if result['bytes'] is None and ranged is not None:
+        result['bytes'] = response_size(ranged)
+    result['content_type'] = (response.headers.get('Content-Type') or '').split(';')[0].strip().lower() or None
+    result['content_encoding'] = (response.headers.get('Content-Encoding') or '').lower() or None
+    result['cache_control'] = response.headers.get('Cache-Control') or (
+        'expires' if response.headers.get('Expires') else None
+    )
+    return result
+
+# True if a Cache-Control value lets browsers reuse the asset
+def is_cacheable(cache_control):
+    if not cache_control:
+        return False
+    value = cache_control.lower()
+    if 'no-store' in value or 'no-cache' in value:
+        return False
+    if value == 'expires' or 'immutable' in value:
+        return True
+    match = re.search(r'max-age=(\d+)', value)
+    return bool(match and int(match.group(1)) > 0)
+
+def image_format(probe):
+    content_type = probe.get('content_type') or ''
+    if content_type.startswith('image/'):
+        return content_type[6:].replace('svg+xml', 'svg').replace('jpeg', 'jpg')
+    ext = urlsplit(probe['url']).path.rsplit('.', 1)
+    return ext[1].lower().replace('jpeg', 'jpg') if len(ext) == 2 and len(ext[1]) <= 4 else 'unknown'
+
+def size_bucket(size):
+    for limit, label in IMAGE_SIZE_BUCKETS:
+        if limit is None or size < limit:
+            return label
+
+# Function to turn the probe results into page-level metrics
+def summarize(site_data, probes):
+    ok = [p for p in probes if p['status'] and p['status'] < 400]
+    sized = [p for p in ok if p['bytes'] is not None]
+    text_assets = [p for p in ok if p['type'] in TEXT_TYPES]
+    images = [p for p in ok if p['type'] == 'image']
+
+    formats = {}
+    buckets = {}
+    for p in images:
+        fmt = image_format(p)
+        formats[fmt] = formats.get(fmt, 0) + 1
+        if p['bytes'] is not None:
+            label = size_bucket(p['bytes'])
+            buckets[label] = buckets.get(label, 0) + 1
+
+    headers = {name.lower(): value for name, value in site_data.get('security_headers', {}).items()}
+    csp = headers.get('content-security-policy', '')
+    final_url = site_data.get('final_url') or site_data['url']
+
+    return {
+        'request_count': 1 + len(probes),
+        'failed_requests': len(probes) - len(ok),
+        'total_bytes': site_data.get('html_bytes', 0) + sum(p['bytes'] for p in sized),
+        'unknown_size_count': len(ok) - len(sized),
+        'bytes_by_type': {
+            kind: sum(p['bytes'] for p in sized if p['type'] == kind)
+            for kind in ('image', 'stylesheet', 'script', 'font')
+        },
+        'compression_coverage': (
+            sum(1 for p in text_assets if p['content_encoding'] in COMPRESSED_ENCODINGS) / len(text_assets)
+            if text_assets else None
+        ),
+        'cache_coverage': sum(1 for p in ok if is_cacheable(p['cache_control'])) / len(ok) if ok else None,
+        'image_formats': formats,
+        'image_sizes': buckets,
+        'modern_image_share': (
+            sum(n for fmt, n in formats.items() if fmt in MODERN_IMAGE_FORMATS) / len(images) if images else None
+        ),
+        'security': {
+            'https': urlsplit(final_url).scheme == 'https',
+            'tls_version': site_data.get('tls_version'),
+            'hsts': 'strict-transport-security' in headers,
+            'csp': bool(csp),
+            'x_content_type_options': headers.get('x-content-type-options', '').lower() == 'nosniff',
+            'frame_protection': 'x-frame-options' in headers or 'frame-ancestors' in csp,
+            'referrer_policy': 'referrer-policy' in headers,
+        },
+    }
+
+# Performance score out of 100 from page weight, request count, compression,
+# caching and image formats
+def performance_score(report):
+    score = 100.0
+    megabytes = report['total_bytes'] / (1024 * 1024)
+    score -= min(40, max(0, megabytes - 1) * 10)
+    score -= min(20, max(0, report['request_count'] - 50) * 0.5)
+    if report['compression_coverage'] is not None:
+        score -= 15 * (1 - report['compression_coverage'])
+    if report['cache_coverage'] is not None:
+        score -= 15 * (1 - report['cache_coverage'])
+    if report['modern_image_share'] is not None:
+        score -= 10 * (1 - report['modern_image_share'])
+    return max(0, min(100, int(round(score))))
+
+# Security score out of 100 from TLS and the main response's headers
+def security_score(report):
+    security = report['security']
+    score = 0
+    if security['https']:
+        score += 25
+        if security['tls_version'] in ('TLSv1.2', 'TLSv1.3'):
+            score += 5
+    score += 20 if security['hsts'] else 0
+    score += 20 if security['csp'] else 0
+    score += 10 if security['x_content_type_options'] else 0
+    score += 10 if security['frame_protection'] else 0
+    score += 10 if security['referrer_policy'] else 0
+    return score
+
+
+# Shares one connection pool and one probe thread pool between audits, so
+# several concurrent audits can't multiply the number of open connections
+class AssetAuditor:
+    def __init__(self, concurrency=32, timeout=5, max_assets=500, session=None):
+        self.timeout = timeout
+        self.max_assets = max_assets
+        self.session = session or make_session(concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='asset')
+
+    def audit(self, site_data):
+        assets = collect_assets(site_data, self.max_assets)
+        probes = list(self.pool.map(lambda asset: probe_asset(self.session, asset, self.timeout), assets))
+        report = summarize(site_data, probes)
+        report['performance_score'] = performance_score(report)
+        report['security_score'] = security_score(report)
+        report['assets'] = probes
+        return report
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
@@ -0,0 +1,408 @@
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cro_streamlit import (
+    audit_assets, calculate_scores, generate_analysis, generate_summary, generate_html_report,
+    record_snapshot, get_scrape_cache,
+)
+from scraper import fetch_site_data, make_session
+from pipeline import StagePipeline
+from scrape_cache import DEFAULT_CACHE_DIR
+from tracing import tracer
+
+# Audit jobs for the HTTP API.
+#
+# Jobs live in a SQLite database that every API and worker process on the
+# host shares: the API inserts them, any process's JobRunner claims them
+# (an atomic UPDATE, so each job runs once), and status reads go to the same
+# table, so a job can be submitted to one process and polled from another.
+# Each JobRunner runs at most `workers` audits at a time with one pooled
+# HTTP session; the analysis cache, rate limiter and PDF renderer are the
+# process-wide ones from cro_streamlit. Submissions beyond `max_queued`
+# waiting jobs are refused, which the API turns into 429 responses.
+#
+# Extra worker processes without an HTTP server:
+#
+#   python backend/jobs.py --workers 8
+
+JOBS_DB = os.getenv('CRO_JOBS_DB', os.path.join(DEFAULT_CACHE_DIR, 'jobs.sqlite3'))
+API_WORKERS = int(os.getenv('CRO_API_WORKERS', '4'))
+MAX_QUEUED = int(os.getenv('CRO_API_MAX_QUEUE', '100'))
+# Finished jobs (and their results) are deleted after this many seconds
+JOB_TTL = int(os.getenv('CRO_JOB_TTL', str(7 * 24 * 3600)))
+# A running job whose process stopped sending heartbeats is retried
+HEARTBEAT_SECONDS = 15
+STALE_SECONDS = 120
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 0.5
+# Job-store writes that hit a locked or unavailable database are retried
+# this many times, backing off up to RETRY_SECONDS between tries
+WRITE_ATTEMPTS = 5
+RETRY_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stages TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    result BLOB,
+    html BLOB,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id);
+"""
+
+
+class QueueFull(Exception):
+    def __init__(self, queued, limit):
+        super().__init__(f"Audit queue is full: {queued} audits waiting, limit {limit}")
+        self.queued = queued
+        self.limit = limit
+
+
+class JobStore:
+    def __init__(self, path=JOBS_DB, max_queued=MAX_QUEUED, ttl=JOB_TTL):
+        self.path = path
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    # One connection per thread; SQLite handles locking between processes
+    def _db(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    # Queues one job per URL, all or none; raises QueueFull past max_queued
+    def submit(self, urls):
+        batch_id = uuid.uuid4().hex
+        now = time.time()
+        jobs = [{'id': uuid.uuid4().hex, 'url': url, 'status': 'queued'} for url in urls]
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued + len(jobs) > self.max_queued:
+                raise QueueFull(queued, self.max_queued)
+            db.executemany(
+                "INSERT INTO jobs (id, batch_id, url, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                [(job['id'], batch_id, job['url'], now, now) for job in jobs],
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return batch_id, jobs
+
+    # Marks the oldest queued job as running on `worker` and returns it
+    def claim(self, worker):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                "SELECT id, url FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "started_at = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                    (worker, now, now, now, row[0]),
+                )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return {'id': row[0], 'url': row[1]} if row else None
+
+    def stage_done(self, job_id, stages):
+        now = time.time()
+        self._db().execute(
+            'UPDATE jobs SET stages = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?',
+            (json.dumps(stages), now, now, job_id),
+        )
+
+    def finish(self, job_id, result, html):
+        now = time.time()
+        self._db().execute(
+            "UPDATE jobs SET status = 'done', result = ?, html = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+            (zlib.compress(json.dumps(result).encode('utf-8')), zlib.compress(html.encode('utf-8')), now, now, job_id),
+        )
+
+    def fail(self, job_id, error):
+        now = time.time()
+        self._db().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+            (error, now, now, job_id),
+        )
+
+    # Keeps the given running jobs from being requeued by sweep()
+    def heartbeat(self, job_ids):
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        self._db().execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND id IN ({', '.join('?' * len(job_ids))})",
+            (time.time(), *job_ids),
+        )
+
+    # Requeues jobs whose worker died (or fails them after MAX_ATTEMPTS) and
+    # deletes finished jobs older than the TTL
+    def sweep(self):
+        now = time.time()
+        db = self._db()
+        db.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker stopped while running this audit', "
+            "finished_at = ?, updated_at = ? WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+            (now, now, now - STALE_SECONDS, MAX_ATTEMPTS),
+        )
+        db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+            "WHERE status = 'running' AND heartbeat_at < ?",
+            (now, now - STALE_SECONDS),
+        )
+        db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - self.ttl,))
+
+    # Status of one job without its result, or None
+    def get(self, job_id):
+        row = self._db().execute(
+            'SELECT id, batch_id, url, status, stages, error, attempts, created_at, started_at, finished_at, updated_at '
+            'FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        return self._status(row) if row else None
+
+    def batch(self, batch_id):
+        rows = self._db().execute(
+            'SELECT id, batch_id, url, status, stages, error, attempts, created_at, started_at, finished_at, updated_at '
+            'FROM jobs WHERE batch_id = ? ORDER BY rowid', (batch_id,)
+        ).fetchall()
+        return [self._status(row) for row in rows]
+
+    @staticmethod
+    def _status(row):
+        job = dict(zip(
+            ('id', 'batch_id', 'url', 'status', 'stages', 'error', 'attempts',
+             'created_at', 'started_at', 'finished_at', 'updated_at'), row,
+        ))
+        job['stages'] = json.loads(job['stages'])
+        return job
+
+    def result(self, job_id):
+        row = self._db().execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row and row[0] else None
+
+    def html(self, job_id):
+        row = self._db().execute('SELECT html FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row and row[0] else None
+
+    # Job counts by status, across every process sharing the database
+    def counts(self):
+        return dict(self._db().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+# Runs one audit through the same stages as the Streamlit app
+def run_audit(url, session, on_stage=None):
+    def analyze(site_data):
+        analysis = generate_analysis(site_data)
+        if analysis.startswith("Error generating analysis"):
+            raise RuntimeError(analysis)
+        return analysis
+
+    def required(name, fn):
+        # The app's stage functions report errors and return None
+        def stage(*args):
+            value = fn(*args)
+            if value is None:
+                raise RuntimeError(f"{name} failed")
+            return value
+        return stage
+
+    pipeline = StagePipeline()
+    pipeline.add('site_data', lambda: fetch_site_data(url, session, get_scrape_cache()))
+    pipeline.add('assets', audit_assets, ['site_data'])
+    pipeline.add('scores', calculate_scores, ['site_data', 'assets'])
+    pipeline.add('analysis', analyze, ['site_data'])
+    pipeline.add('summary', required('summary', generate_summary), ['analysis', 'scores'])
+    pipeline.add('html_report', required('html_report', generate_html_report), ['site_data', 'analysis', 'scores', 'summary'])
+    pipeline.add('history', record_snapshot, ['site_data', 'assets', 'scores', 'analysis'])
+
+    results = {}
+    with tracer.span('audit', url=url):
+        for kind, name, value in pipeline.run():
+            if kind == 'failed':
+                # Stages fail in dependency order, so the first failure is the cause
+                raise RuntimeError(f"{name}: {value}")
+            if kind == 'done':
+                results[name] = value
+                if on_stage:
+                    on_stage(name)
+
+    site_data = {k: v for k, v in results['site_data'].items() if k != 'content'}
+    assets = results['assets']
+    if assets:
+        assets = {k: v for k, v in assets.items() if k != 'assets'}
+    result = {
+        'url': url,
+        'site_data': site_data,
+        'assets': assets,
+        'scores': results['scores'],
+        'analysis': results['analysis'],
+        'summary': results['summary'],
+        'changes': results['history']['diff'] if results['history'] else None,
+        'timings': {name: round(seconds, 3) for name, seconds in pipeline.timings.items()},
+    }
+    return result, results['html_report']
+
+
+class JobRunner:
+    def __init__(self, store, workers=API_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.session = make_session(max(10, workers * 2))
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+        # Ids of the jobs this runner is working on; only these get heartbeats
+        self.running = set()
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return len(self.running)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if self.workers:
+            thread = threading.Thread(target=self._housekeeping, name='job-heartbeat', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # Lets idle workers in this process pick up a new job without waiting
+    # for the next poll
+    def notify(self):
+        self.wakeup.set()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.session.close()
+
+    def _work(self):
+        while not self.stopping.is_set():
+            try:
+                job = self.store.claim(self.worker_id)
+            except sqlite3.Error as e:
+                print(f"claiming a job failed: {e}", file=sys.stderr)
+                self.stopping.wait(RETRY_SECONDS)
+                continue
+            if job is None:
+                self.wakeup.wait(POLL_SECONDS)
+                self.wakeup.clear()
+                continue
+            with self.lock:
+                self.running.add(job['id'])
+            try:
+                self._run(job)
+            except Exception as e:
+                # The job's heartbeats stop below, so sweep() retries it
+                print(f"job {job['id']} could not be recorded: {e}", file=sys.stderr)
+            finally:
+                with self.lock:
+                    self.running.discard(job['id'])
+
+    def _run(self, job):
+        stages = []
+
+        def on_stage(name):
+            stages.append(name)
+            try:
+                self.store.stage_done(job['id'], stages)
+            except sqlite3.Error as e:
+                # Progress is informational; the next stage writes it again
+                print(f"job {job['id']} progress not saved: {e}", file=sys.stderr)
+
+        try:
+            result, html = run_audit(job['url'], self.session, on_stage)
+        except Exception as e:
+            self._write(self.store.fail, job['id'], str(e))
+            return
+        self._write(self.store.finish, job['id'], result, html)
+
+    # Runs a job-store write, retrying while the database is locked or
+    # unavailable; raises the last error once the attempts are used up
+    def _write(self, fn, *args):
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                return fn(*args)
+            except sqlite3.Error as e:
+                if attempt == WRITE_ATTEMPTS - 1:
+                    raise
+                print(f"{fn.__name__} failed, retrying: {e}", file=sys.stderr)
+                time.sleep(min(RETRY_SECONDS, 0.5 * 2 ** attempt))
+
+    def _housekeeping(self):
+        while not self.stopping.wait(HEARTBEAT_SECONDS):
+            try:
+                with self.lock:
+                    running = list(self.running)
+                self.store.heartbeat(running)
+                self.store.sweep()
+            except sqlite3.Error as e:
+                print(f"job housekeeping failed: {e}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run audit workers for jobs submitted through the HTTP API.")
+    parser.add_argument('--workers', type=int, default=API_WORKERS, help="audits to run at the same time")
+    parser.add_argument('--db', default=JOBS_DB, help="job database shared with the API processes")
+    args = parser.parse_args(argv)
+
+    runner = JobRunner(JobStore(args.db), args.workers)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    runner.start()
+    print(f"Worker {runner.worker_id} running {args.workers} audits at a time from {args.db}", file=sys.stderr)
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    # Jobs still running are picked up again by another process once their
+    # heartbeat goes stale
+    runner.stop(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
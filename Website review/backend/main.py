@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from jobs import JobRunner, JobStore, QueueFull, API_WORKERS
+from cro_streamlit import render_pdf
+from tracing import tracer
+
+# HTTP API for the React frontend and other clients.
+#
+#   POST /jobs                      {"url": ...} or {"urls": [...]}  -> 202, job ids
+#   GET  /jobs/{id}                 status and finished stages
+#   GET  /jobs/{id}/events          the same as server-sent events until the job ends
+#   GET  /jobs/{id}/result          scores, analysis and summary as JSON
+#   GET  /jobs/{id}/report.html     the HTML report
+#   GET  /jobs/{id}/report.pdf      the PDF report, rendered on first download
+#   GET  /batches/{id}              status of every job of one submission
+#   GET  /metrics                   Prometheus metrics
+#
+# Audits run on the JobRunner of whichever process claims them (see jobs.py),
+# so the API scales by starting more processes on the same job database:
+#
+#   cd backend && uvicorn main:app --workers 4
+#
+# When the queue is full, POST /jobs answers 429 with a Retry-After header.
+
+CORS_ORIGINS = os.getenv('CRO_API_CORS_ORIGINS', 'http://localhost:3000').split(',')
+EVENT_POLL_SECONDS = 0.5
+# Comment line sent to keep idle event streams open through proxies
+EVENT_KEEPALIVE_SECONDS = 15
+# Assumed seconds per audit when estimating Retry-After
+AUDIT_SECONDS = 30
+
+store = JobStore()
+runner = JobRunner(store, API_WORKERS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    runner.start()
+    yield
+    # Unfinished jobs are retried by another process once their heartbeat stops
+    await run_in_threadpool(runner.stop, 5)
+
+
+app = FastAPI(title="CRO Reviewer API", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=['*'], allow_headers=['*'])
+
+
+class JobRequest(BaseModel):
+    url: Optional[str] = None
+    urls: List[str] = []
+
+
+def find_job(job_id):
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+    return job
+
+def finished_job(job_id):
+    job = find_job(job_id)
+    if job['status'] == 'failed':
+        raise HTTPException(422, f"Audit failed: {job['error']}")
+    if job['status'] != 'done':
+        raise HTTPException(409, f"Audit is {job['status']}")
+    return job
+
+
+@app.post('/jobs', status_code=202)
+async def submit_jobs(body: JobRequest):
+    urls = [url.strip() for url in ([body.url] if body.url else []) + body.urls if url and url.strip()]
+    if not urls:
+        raise HTTPException(422, "Provide a url or a list of urls")
+    for url in urls:
+        if not url.startswith(('http://', 'https://')):
+            raise HTTPException(422, f"Not an http(s) URL: {url}")
+    if len(urls) > store.max_queued:
+        raise HTTPException(422, f"At most {store.max_queued} URLs per request")
+    try:
+        batch_id, jobs = await run_in_threadpool(store.submit, urls)
+    except QueueFull as e:
+        # Roughly how long until enough queued audits have started
+        excess = e.queued + len(urls) - e.limit
+        retry_after = max(1, AUDIT_SECONDS * excess // max(1, API_WORKERS))
+        return JSONResponse({'detail': str(e)}, status_code=429, headers={'Retry-After': str(retry_after)})
+    runner.notify()
+    return {'batch_id': batch_id, 'jobs': jobs}
+
+@app.get('/jobs/{job_id}')
+async def job_status(job_id: str):
+    return await run_in_threadpool(find_job, job_id)
+
+@app.get('/batches/{batch_id}')
+async def batch_status(batch_id: str):
+    jobs = await run_in_threadpool(store.batch, batch_id)
+    if not jobs:
+        raise HTTPException(404, "Unknown batch")
+    return {'batch_id': batch_id, 'jobs': jobs}
+
+@app.get('/jobs/{job_id}/events')
+async def job_events(job_id: str, request: Request):
+    job = await run_in_threadpool(find_job, job_id)
+
+    # Polls the job database, which also sees jobs run by other processes
+    async def events():
+        current = job
+        last_update = None
+        last_sent = time.monotonic()
+        while True:
+            if current['updated_at'] != last_update:
+                last_update = current['updated_at']
+                last_sent = time.monotonic()
+                yield f"event: {current['status']}\ndata: {json.dumps(current)}\n\n"
+                if current['status'] in ('done', 'failed'):
+                    return
+            elif time.monotonic() - last_sent > EVENT_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(EVENT_POLL_SECONDS)
+            if await request.is_disconnected():
+                return
+            current = await run_in_threadpool(store.get, job_id)
+            if current is None:
+                return
+
+    return StreamingResponse(
+        events(), media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.get('/jobs/{job_id}/result')
+async def job_result(job_id: str):
+    await run_in_threadpool(finished_job, job_id)
+    return await run_in_threadpool(store.result, job_id)
+
+@app.get('/jobs/{job_id}/report.html', response_class=HTMLResponse)
+async def job_report_html(job_id: str):
+    await run_in_threadpool(finished_job, job_id)
+    return HTMLResponse(await run_in_threadpool(store.html, job_id))
+
+@app.get('/jobs/{job_id}/report.pdf')
+async def job_report_pdf(job_id: str):
+    await run_in_threadpool(finished_job, job_id)
+    html = await run_in_threadpool(store.html, job_id)
+    try:
+        # Bounded render pool with an on-disk cache, shared with the Streamlit app
+        pdf = await run_in_threadpool(render_pdf, html)
+    except Exception as e:
+        raise HTTPException(500, f"Error generating PDF: {str(e)}")
+    return Response(pdf, media_type='application/pdf', headers={
+        'Content-Disposition': f'attachment; filename="cro_analysis_report_{job_id[:8]}.pdf"',
+    })
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    counts = await run_in_threadpool(store.counts)
+    lines = ['# HELP cro_jobs Audit jobs in the shared job database by status.', '# TYPE cro_jobs gauge']
+    for status in ('queued', 'running', 'done', 'failed'):
+        lines.append(f'cro_jobs{{status="{status}"}} {counts.get(status, 0)}')
+    lines += ['# HELP cro_worker_active_jobs Audits running in this process.', '# TYPE cro_worker_active_jobs gauge',
+              f'cro_worker_active_jobs {runner.active}']
+    return '\n'.join(lines) + '\n' + tracer.prometheus()
+
+@app.get('/health')
+async def health():
+    return {'status': 'ok', 'workers': runner.workers, 'active': runner.active}
@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_page
+from server import PageServer
+
+# Compares the streaming extractor in fetch_site_data with the previous
+# "download everything, build a BeautifulSoup tree" scraper on synthetic
+# e-commerce pages served from a local HTTP server. Each measurement runs in
+# a fresh subprocess so peak RSS is not polluted by earlier runs.
+#
+#   python benchmarks/bench_extractor.py --sizes 0.5,2,5
+#
+# Sizes are in MB. Needs beautifulsoup4 installed for the legacy side.
+
+
+# The scraper as it was before the streaming extractor, kept for comparison
+def legacy_scrape(url):
+    import requests
+    from bs4 import BeautifulSoup
+    from scraper import DEFAULT_HEADERS
+
+    response = requests.get(url, headers=DEFAULT_HEADERS, timeout=60)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.content, 'html.parser')
+    data = {
+        'title': soup.title.string.strip() if soup.title else 'No title',
+        'meta_description': soup.find('meta', attrs={'name': 'description'})['content'].strip() if soup.find('meta', attrs={'name': 'description'}) else 'No meta description',
+        'headers': [h.get_text().strip() for h in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])],
+        'images': [{'src': img['src'], 'alt': img.get('alt', '')} for img in soup.find_all('img') if img.get('src')],
+        'links': [a['href'] for a in soup.find_all('a') if a.get('href')],
+        'content': soup.get_text().strip(),
+        'status_code': response.status_code,
+        'url': url
+    }
+    data['word_count'] = len(data['content'].split())
+    return data
+
+def streaming_scrape(url):
+    from scraper import fetch_site_data
+    return fetch_site_data(url)
+
+
+# Child process entry point: scrape once and report time and RSS growth
+def measure(variant, url):
+    scrape = legacy_scrape if variant == 'legacy' else streaming_scrape
+    # Import everything up front so module loading isn't counted
+    import scraper  # noqa: F401
+    if variant == 'legacy':
+        import bs4  # noqa: F401
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    data = scrape(url)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'seconds': elapsed,
+        'peak_rss_growth_kb': rss_after - rss_before,
+        'headers': len(data['headers']),
+        'words': data['word_count'],
+    }))
+
+def run_child(variant, url):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', variant, url],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the streaming extractor against the BeautifulSoup scraper.")
+    parser.add_argument('--sizes', default='0.5,2,5', help="comma-separated page sizes in MB")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per variant; the fastest is reported")
+    parser.add_argument('--child', nargs=2, metavar=('VARIANT', 'URL'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        measure(*args.child)
+        return 0
+
+    sizes = [float(s) for s in args.sizes.split(',')]
+    pages = {f"{size}mb.html": make_page(int(size * 1024 * 1024)) for size in sizes}
+    server = PageServer(pages)
+    try:
+        print(f"{'page':>10} {'variant':>10} {'seconds':>9} {'peak RSS +MB':>13} {'headers':>8} {'words':>9}")
+        for name in pages:
+            for variant in ('legacy', 'streaming'):
+                runs = [run_child(variant, server.url + name) for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r['seconds'])
+                rss = min(r['peak_rss_growth_kb'] for r in runs) / 1024
+                print(f"{name:>10} {variant:>10} {best['seconds']:>9.3f} {rss:>13.1f} {best['headers']:>8} {best['words']:>9}")
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import ensure_corpus
+from server import PageServer
+
+# End-to-end benchmark of the analysis stages, fully offline.
+#
+# Every page of the corpus is served from a local server with configurable
+# latency and bandwidth, and the LLM is replaced with fake_llm.FakeModel. Each
+# page is measured in a fresh subprocess: the stages run `--repeat` times for
+# wall time (fastest run kept), then once more under tracemalloc for the peak
+# Python memory each stage allocates.
+#
+#   python benchmarks/bench_pipeline.py                     # print results
+#   python benchmarks/bench_pipeline.py --check             # compare to baseline.json
+#   python benchmarks/bench_pipeline.py --save-baseline     # record a new baseline
+#
+# Analysis and PDF are measured uncached (map/reduce calls and the raw PDF
+# render), so repeated runs measure work rather than cache hits.
+#
+# Corpus throughput comes from a separate run: `--bulk-copies` copies of every
+# page (distinct URLs, so nothing is served from a cache) go through
+# bulk_audit.BulkAuditor at its default concurrency, PDFs included.
+
+STAGES = ('scrape_website', 'audit_assets', 'calculate_scores', 'analysis', 'generate_html_report', 'generate_pdf')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# A stage only counts as a regression if it is both this much slower
+# (relative) and slower by more than the absolute floor
+DEFAULT_TOLERANCE = 0.25
+SECONDS_FLOOR = 0.01
+MEMORY_FLOOR_MB = 1.0
+DEFAULT_BULK_COPIES = 8
+
+
+# Child process: run every stage on one page; returns per-stage seconds and peak MB
+def measure(url, repeat):
+    import cro_streamlit as app
+    from pdf_renderer import render_html, resolve_backend
+
+    backend = resolve_backend()
+
+    def analysis(r):
+        analyzer, prompt = app.prepare_analysis(r['scrape_website'])
+        return analyzer.reduce(prompt)
+
+    def html_report(r):
+        summary = app.generate_summary(r['analysis'], r['calculate_scores'])
+        return app.generate_html_report(r['scrape_website'], r['analysis'], r['calculate_scores'], summary)
+
+    steps = {
+        'scrape_website': lambda r: app.scrape_website(url),
+        'audit_assets': lambda r: app.audit_assets(r['scrape_website']),
+        'calculate_scores': lambda r: app.calculate_scores(r['scrape_website'], r['audit_assets']),
+        'analysis': analysis,
+        'generate_html_report': html_report,
+        'generate_pdf': lambda r: render_html(backend, r['generate_html_report']),
+    }
+
+    def run_once(traced):
+        results = {}
+        seconds = {}
+        peaks = {}
+        for name in STAGES:
+            if traced:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            results[name] = steps[name](results)
+            seconds[name] = time.perf_counter() - start
+            if traced:
+                peaks[name] = (tracemalloc.get_traced_memory()[1] - before) / (1024 * 1024)
+            if results[name] is None and name != 'audit_assets':
+                raise RuntimeError(f"{name} failed for {url}")
+        return results, seconds, peaks
+
+    # One untimed run loads lazily imported modules and starts the shared pools
+    results, _, _ = run_once(False)
+    best = {name: None for name in STAGES}
+    for _ in range(repeat):
+        _, seconds, _ = run_once(False)
+        for name in STAGES:
+            best[name] = seconds[name] if best[name] is None else min(best[name], seconds[name])
+    tracemalloc.start()
+    _, _, peaks = run_once(True)
+    tracemalloc.stop()
+
+    return {
+        'stages': {name: {'seconds': round(best[name], 4), 'peak_mb': round(peaks[name], 2)} for name in STAGES},
+        'seconds': round(sum(best.values()), 4),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'html_bytes': results['scrape_website']['html_bytes'],
+        'pdf_bytes': len(results['generate_pdf']),
+    }
+
+# Child process: audit all the URLs at once with BulkAuditor; returns sites/min
+def measure_bulk(urls):
+    from bulk_audit import BulkAuditor
+
+    class Collector:
+        def __init__(self):
+            self.records = []
+
+        def write(self, record):
+            self.records.append(record)
+
+    writer = Collector()
+    with tempfile.TemporaryDirectory() as pdf_dir:
+        auditor = BulkAuditor(writer, pdf_dir=pdf_dir, history=False)
+        start = time.perf_counter()
+        finished, failed = auditor.run(urls)
+        seconds = time.perf_counter() - start
+    if failed:
+        errors = [r.get('error') or r.get('pdf_error') for r in writer.records if r['status'] != 'ok']
+        raise RuntimeError(f"{failed} of {finished} bulk audits failed: {errors[0]}")
+    return {
+        'sites': finished,
+        'seconds': round(seconds, 3),
+        'sites_per_min': round(60 * finished / seconds, 1),
+    }
+
+def run_child(args, env):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + args,
+        check=True, capture_output=True, text=True, env=env,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+# Function to list stages that got slower or hungrier than the baseline
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for page, result in results['pages'].items():
+        old_page = baseline['pages'].get(page)
+        if not old_page:
+            continue
+        for stage, new in result['stages'].items():
+            old = old_page['stages'].get(stage)
+            if not old:
+                continue
+            if new['seconds'] > old['seconds'] * (1 + tolerance) and new['seconds'] - old['seconds'] > SECONDS_FLOOR:
+                regressions.append(f"{page} {stage}: {old['seconds']:.3f}s -> {new['seconds']:.3f}s")
+            if new['peak_mb'] > old['peak_mb'] * (1 + tolerance) and new['peak_mb'] - old['peak_mb'] > MEMORY_FLOOR_MB:
+                regressions.append(f"{page} {stage}: {old['peak_mb']:.1f}MB -> {new['peak_mb']:.1f}MB peak")
+    return regressions
+
+def print_results(results):
+    print(f"{'page':>16} {'stage':>22} {'seconds':>9} {'peak MB':>9}")
+    for page, result in results['pages'].items():
+        for stage, m in result['stages'].items():
+            print(f"{page:>16} {stage:>22} {m['seconds']:>9.3f} {m['peak_mb']:>9.1f}")
+        print(f"{page:>16} {'total':>22} {result['seconds']:>9.3f} {result['max_rss_mb']:>9.1f} max RSS")
+    throughput = results.get('throughput')
+    if throughput:
+        print(f"Corpus throughput: {throughput['sites_per_min']:.1f} sites/min "
+              f"({throughput['sites']} sites through BulkAuditor in {throughput['seconds']:.1f}s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scrape -> score -> analysis -> report -> PDF offline.")
+    parser.add_argument('--latency', type=float, default=0.02, help="server delay before each response, seconds")
+    parser.add_argument('--bandwidth', type=float, default=0, help="server transfer rate per connection in MB/s (0 = unlimited)")
+    parser.add_argument('--llm-latency', type=float, default=0.1, help="fake LLM delay per call, seconds")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per page; the fastest is reported")
+    parser.add_argument('--max-size', type=float, help="skip corpus pages larger than this many MB")
+    parser.add_argument('--bulk-copies', type=int, default=DEFAULT_BULK_COPIES,
+                        help="copies of each page audited concurrently for the throughput figure (0 = skip)")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    parser.add_argument('--check', action='store_true', help="exit 1 if a stage regressed against the baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results to the baseline file")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument('--child', metavar='URL', help=argparse.SUPPRESS)
+    parser.add_argument('--child-bulk', metavar='URL', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat)))
+        return 0
+    if args.child_bulk:
+        print(json.dumps(measure_bulk(args.child_bulk)))
+        return 0
+
+    settings = {
+        'latency': args.latency, 'bandwidth_mb_s': args.bandwidth,
+        'llm_latency': args.llm_latency, 'repeat': args.repeat, 'bulk_copies': args.bulk_copies,
+    }
+    max_size = int(args.max_size * 1024 * 1024) if args.max_size else None
+    corpus = ensure_corpus(max_size=max_size)
+    pages = {}
+    for name, path in corpus.items():
+        with open(path, 'rb') as f:
+            pages[f"{name}.html"] = f.read()
+    server = PageServer(pages, latency=args.latency, bandwidth=int(args.bandwidth * 1024 * 1024))
+
+    results = {'settings': settings, 'pages': {}}
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = dict(
+                os.environ,
+                CRO_FAKE_LLM='1', CRO_FAKE_LLM_LATENCY=str(args.llm_latency),
+                GEMINI_RPM='1000000', GEMINI_TPM='1000000000', CRO_CACHE_DIR=cache_dir,
+                CRO_HISTORY_DB=os.path.join(cache_dir, 'history.sqlite3'),
+            )
+            for name in corpus:
+                results['pages'][name] = run_child(['--child', server.url + f"{name}.html", '--repeat', str(args.repeat)], env)
+                print(f"measured {name}", file=sys.stderr)
+            if args.bulk_copies > 0:
+                # The query string only makes each copy a distinct page to the caches
+                urls = [server.url + f"{name}.html?copy={i}" for i in range(args.bulk_copies) for name in corpus]
+                results['throughput'] = run_child(['--child-bulk'] + urls, env)
+                print(f"measured throughput over {len(urls)} sites", file=sys.stderr)
+    finally:
+        server.close()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+    if args.check:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print(f"Warning: baseline was recorded with {baseline.get('settings')}", file=sys.stderr)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
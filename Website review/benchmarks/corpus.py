@@ -0,0 +1,153 @@
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# HTML corpus for the benchmarks.
+#
+# The standard corpus is synthetic and deterministic: pages from 10 KB to
+# 20 MB built from three templates (landing page, long article, product
+# listing), written to benchmarks/corpus/ the first time they're needed so
+# every run and every machine benchmarks byte-identical pages. Real pages can
+# be recorded next to them and are picked up automatically:
+#
+#   python benchmarks/corpus.py record https://example.com/ --name example-home
+#   python benchmarks/corpus.py list
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+# (name, template, size in bytes)
+STANDARD_CORPUS = (
+    ('landing-10k', 'landing', 10 * 1024),
+    ('article-100k', 'article', 100 * 1024),
+    ('listing-1m', 'listing', 1024 * 1024),
+    ('article-5m', 'article', 5 * 1024 * 1024),
+    ('listing-20m', 'listing', 20 * 1024 * 1024),
+)
+
+WORDS = (
+    "shipping order quality price customer service product design fast secure "
+    "support guarantee review trusted simple modern premium value delivery return "
+    "account checkout offer discount team story mission feature benefit solution"
+).split()
+
+
+def _head(title, description):
+    return (
+        f"<!DOCTYPE html><html lang=\"en\"><head><meta charset=\"utf-8\"><title>{title}</title>"
+        f"<meta name=\"description\" content=\"{description}\">"
+        "<link rel=\"stylesheet\" href=\"/static/site.css\">"
+        "<link rel=\"preload\" as=\"font\" href=\"/static/brand.woff2\">"
+        "<script src=\"/static/app.js\" defer></script>"
+        "<style>" + ".card{margin:0 auto;padding:4px}" * 200 + "</style>"
+        "<script>" + "window.dataLayer=window.dataLayer||[];" * 200 + "</script>"
+        "</head><body>"
+    )
+
+def _paragraph(rng, words=60):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return f"<p>{text.capitalize()}.</p>"
+
+def _landing_block(rng, i):
+    return (
+        f"<section><h2>Why customers choose us #{i}</h2>{_paragraph(rng, 40)}"
+        f"<img src=\"/img/hero-{i}.webp\" alt=\"Happy customer {i}\">"
+        f"<a class=\"cta\" href=\"/signup?ref={i}\">Start your free trial</a></section>"
+    )
+
+def _article_block(rng, i):
+    heading = f"<h2>Chapter {i // 10 + 1}</h2>" if i % 10 == 0 else ''
+    image = f"<img src=\"/img/figure-{i}.png\" alt=\"{'Figure ' + str(i) if i % 4 else ''}\">" if i % 5 == 0 else ''
+    return f"{heading}<h3>Section {i}</h3>{_paragraph(rng)}{_paragraph(rng)}{image}<a href=\"/blog/related-{i}\">Related post</a>"
+
+def _listing_block(rng, i):
+    return (
+        f"<div class=\"card\"><h2>Product {i}</h2>"
+        f"<a href=\"/products/{i}\"><img src=\"/img/{i}.jpg\" alt=\"{'Photo of product ' + str(i) if i % 3 else ''}\"></a>"
+        f"<h3>Details</h3>{_paragraph(rng, 25)}"
+        f"<script>track({i});</script><a href=\"/cart/add/{i}\">Add to cart</a></div>"
+    )
+
+TEMPLATES = {
+    'landing': ("Acme - Get started today", "The fastest way to run your shop", "<h1>Grow your business</h1>", _landing_block),
+    'article': ("The complete guide to online stores", "Everything we learned running a shop", "<h1>The complete guide</h1>", _article_block),
+    'listing': ("Shop - All Products", "Every product we sell", "<h1>All Products</h1>", _listing_block),
+}
+
+# Function to build a deterministic page of roughly `size` bytes
+def make_page(size, template='listing', seed=0):
+    title, description, intro, block = TEMPLATES[template]
+    rng = random.Random(f"{template}-{size}-{seed}")
+    parts = [_head(title, description), intro]
+    total = sum(len(p) for p in parts)
+    i = 0
+    while total < size:
+        part = block(rng, i)
+        parts.append(part)
+        total += len(part)
+        i += 1
+    parts.append("<footer><a href=\"/privacy\">Privacy</a> <a href=\"/contact\">Contact</a></footer></body></html>")
+    return ''.join(parts).encode('utf-8')
+
+# Function to write any missing standard pages and return {name: path}
+# for the whole corpus, standard pages first, then recorded ones by name
+def ensure_corpus(directory=CORPUS_DIR, max_size=None):
+    os.makedirs(directory, exist_ok=True)
+    pages = {}
+    for name, template, size in STANDARD_CORPUS:
+        if max_size and size > max_size:
+            continue
+        path = os.path.join(directory, f"synthetic-{name}.html")
+        if not os.path.exists(path):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(make_page(size, template))
+            os.replace(tmp_path, path)
+        pages[name] = path
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.html') and not filename.startswith('synthetic-'):
+            path = os.path.join(directory, filename)
+            if not max_size or os.path.getsize(path) <= max_size:
+                pages[filename[:-5]] = path
+    return pages
+
+# Function to save a live page into the corpus
+def record(url, name=None, directory=CORPUS_DIR):
+    import requests
+    from scraper import DEFAULT_HEADERS
+
+    response = requests.get(url, headers=DEFAULT_HEADERS, timeout=60)
+    response.raise_for_status()
+    name = name or hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.html")
+    with open(path, 'wb') as f:
+        f.write(response.content)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the benchmark HTML corpus.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help="save a live page into the corpus")
+    rec.add_argument('url')
+    rec.add_argument('--name', help="file name without .html (default: hash of the URL)")
+    sub.add_parser('list', help="generate missing synthetic pages and list the corpus")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        start = time.perf_counter()
+        path = record(args.url, args.name)
+        print(f"Saved {os.path.getsize(path) / 1024:.0f} KB to {path} in {time.perf_counter() - start:.1f}s")
+    else:
+        for name, path in ensure_corpus().items():
+            print(f"{name:>24} {os.path.getsize(path) / 1024:>10.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
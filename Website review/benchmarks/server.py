@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local HTTP server for the benchmarks. Serves the given pages, plus a
+# synthetic response for any image/CSS/JS/font path so the sub-resource audit
+# has something to probe, with a fixed delay before each response (latency)
+# and an optional cap on the transfer rate per connection (bandwidth).
+# Range requests get a 206 without Content-Encoding, as from many CDNs, and
+# head_lengths=False leaves Content-Length off HEAD replies, so the asset
+# probe's fallbacks can be exercised. Pages carry an ETag and answer a
+# matching If-None-Match with 304, for the scrape cache's revalidation.
+# redirects maps paths to a Location answered with a 301.
+#
+# Run on its own it serves the benchmark corpus, as a stub site for trying
+# the app or the HTTP API offline:
+#
+#   python benchmarks/server.py --port 8001 --max-size 1
+#   # -> http://127.0.0.1:8001/landing-10k.html, article-100k.html, ...
+
+ASSET_TYPES = {
+    '.jpg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp', '.svg': 'image/svg+xml',
+    '.css': 'text/css', '.js': 'application/javascript', '.woff2': 'font/woff2',
+}
+WRITE_CHUNK = 16 * 1024
+
+
+# Deterministic 1-200 KB size for a synthetic asset
+def asset_size(path):
+    return 1024 + int(hashlib.sha256(path.encode('utf-8')).hexdigest()[:8], 16) % (199 * 1024)
+
+
+class PageServer:
+    # pages: {path without leading slash: bytes}; latency in seconds;
+    # bandwidth in bytes per second per connection, 0 for unlimited;
+    # redirects: {path without leading slash: Location}
+    def __init__(self, pages, latency=0.0, bandwidth=0, port=0, head_lengths=True, redirects=None):
+        server = self
+        self.pages = pages
+        self.redirects = redirects or {}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.head_lengths = head_lengths
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._respond(head=False)
+
+            def do_HEAD(self):
+                self._respond(head=True)
+
+            def _respond(self, head):
+                path = self.path.split('?', 1)[0]
+                if path.lstrip('/') in server.redirects:
+                    self.send_response(301)
+                    self.send_header('Location', server.redirects[path.lstrip('/')])
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.pages.get(path.lstrip('/'))
+                headers = {'Content-Type': 'text/html; charset=utf-8'}
+                if body is not None:
+                    headers['ETag'] = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                    if self.headers.get('If-None-Match') == headers['ETag']:
+                        self.send_response(304)
+                        self.send_header('ETag', headers['ETag'])
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                else:
+                    ext = path[path.rfind('.'):].lower() if '.' in path else ''
+                    if ext not in ASSET_TYPES:
+                        self.send_error(404)
+                        return
+                    body = b'\0' * asset_size(path)
+                    headers = {'Content-Type': ASSET_TYPES[ext], 'Cache-Control': 'public, max-age=86400'}
+                    if ext in ('.css', '.js'):
+                        headers['Content-Encoding'] = 'gzip'
+                if server.latency:
+                    time.sleep(server.latency)
+                status = 200
+                match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match and not head and int(match.group(1)) < len(body):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2) or len(body) - 1), len(body) - 1)
+                    headers.pop('Content-Encoding', None)
+                    headers['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+                    body = body[start:end + 1]
+                    status = 206
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if server.head_lengths or not head:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not head:
+                    server._write(self.wfile, body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _write(self, wfile, body):
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        view = memoryview(body)
+        for i in range(0, len(body), WRITE_CHUNK):
+            chunk = view[i:i + WRITE_CHUNK]
+            wfile.write(chunk)
+            time.sleep(len(chunk) / self.bandwidth)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    from corpus import ensure_corpus
+
+    parser = argparse.ArgumentParser(description="Serve the benchmark corpus locally.")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.02, help="delay before each response, seconds")
+    parser.add_argument('--bandwidth', type=float, default=0, help="transfer rate per connection in MB/s (0 = unlimited)")
+    parser.add_argument('--max-size', type=float, help="skip corpus pages larger than this many MB")
+    args = parser.parse_args(argv)
+
+    corpus = ensure_corpus(max_size=int(args.max_size * 1024 * 1024) if args.max_size else None)
+    pages = {}
+    for name, path in corpus.items():
+        with open(path, 'rb') as f:
+            pages[f"{name}.html"] = f.read()
+    server = PageServer(pages, latency=args.latency, bandwidth=int(args.bandwidth * 1024 * 1024), port=args.port)
+    for name in pages:
+        print(server.url + name)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
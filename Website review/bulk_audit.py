@@ -0,0 +1,311 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cro_streamlit import (
+    calculate_scores, generate_analysis, generate_summary, generate_html_report, get_snapshot_store,
+    get_rate_limiter, GEMINI_CONCURRENCY,
+)
+from scraper import fetch_site_data, make_session
+from scrape_cache import ScrapeCache, DEFAULT_CACHE_DIR
+from asset_audit import AssetAuditor
+from pdf_renderer import PdfRenderer, PdfBatcher, PDF_WORKERS
+from tracing import tracer
+
+# Headless bulk audit: scrape -> score -> analyze every URL in a file and
+# stream one JSON line per site to the output file as soon as it finishes.
+#
+#   python bulk_audit.py urls.txt -o results.jsonl --fetch-concurrency 50
+#
+# With --pdf-dir, each site's report is also rendered to PDF; reports are
+# rendered in batches on a small worker pool, not one process per site.
+#
+# Re-running with the same output file skips URLs that already have a
+# successful record, so a crashed run can simply be started again. Every
+# audit is also recorded in the audit history (CRO_HISTORY_DB), so weekly
+# re-audits only send changed sections to the model and each record lists
+# what changed since the previous audit.
+
+
+# Function to read URLs from a .txt, .csv or .jsonl file
+def read_urls(path):
+    ext = os.path.splitext(path)[1].lower()
+    urls = []
+    with open(path, newline='', encoding='utf-8') as f:
+        if ext == '.csv':
+            reader = csv.reader(f)
+            rows = list(reader)
+            if not rows:
+                return []
+            header = [c.strip().lower() for c in rows[0]]
+            column = header.index('url') if 'url' in header else 0
+            if 'url' in header:
+                rows = rows[1:]
+            urls = [row[column].strip() for row in rows if len(row) > column]
+        elif ext in ('.jsonl', '.ndjson'):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                urls.append(record['url'] if isinstance(record, dict) else str(record))
+        else:
+            urls = [line.strip() for line in f]
+
+    # Drop blanks, comments and duplicates while keeping the file order
+    seen = set()
+    result = []
+    for url in urls:
+        if url and not url.startswith('#') and url not in seen:
+            seen.add(url)
+            result.append(url)
+    return result
+
+# Function to collect URLs already audited successfully in a previous run
+def load_completed(path):
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partial line left behind by a crash
+                continue
+            if record.get('status') == 'ok':
+                completed.add(record['url'])
+    return completed
+
+# Function to name a site's PDF after its host, plus a hash to keep it unique
+def pdf_filename(url):
+    slug = re.sub(r'[^A-Za-z0-9.-]+', '_', url.split('://', 1)[-1])[:80].strip('_')
+    return f"{slug}-{hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]}.pdf"
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        # Make sure a crash mid-line doesn't glue the next record onto it
+        needs_newline = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self.file = open(path, 'a', encoding='utf-8')
+        if needs_newline:
+            self.file.write('\n')
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class BulkAuditor:
+    def __init__(self, writer, fetch_concurrency=50, llm_concurrency=GEMINI_CONCURRENCY,
+                 skip_analysis=False, include_content=False, cache=None, audit_assets=True,
+                 pdf_dir=None, pdf_workers=PDF_WORKERS, history=True):
+        self.writer = writer
+        self.cache = cache
+        self.skip_analysis = skip_analysis
+        self.include_content = include_content
+        self.session = make_session(fetch_concurrency)
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix='fetch')
+        self.llm_pool = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix='llm')
+        # Each analysis fans out into parallel map calls; the shared limiter
+        # keeps the total in flight at llm_concurrency
+        get_rate_limiter().set_max_concurrent(llm_concurrency)
+        self.asset_auditor = AssetAuditor(concurrency=fetch_concurrency) if audit_assets else None
+        self.history = get_snapshot_store() if history else None
+        self.pdf_dir = pdf_dir
+        self.pdf_renderer = None
+        self.pdf_batcher = None
+        if pdf_dir:
+            os.makedirs(pdf_dir, exist_ok=True)
+            self.pdf_renderer = PdfRenderer(max_workers=pdf_workers)
+            self.pdf_batcher = PdfBatcher(self.pdf_renderer)
+        # Caps how many sites are between "submitted" and "written" so a slow
+        # LLM stage can't make scraped pages pile up in memory.
+        self.pending = threading.BoundedSemaphore(fetch_concurrency + llm_concurrency * 4)
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.finished = 0
+        self.failed = 0
+        self.total = 0
+
+    def run(self, urls):
+        self.total = len(urls)
+        if not urls:
+            self.done.set()
+        for url in urls:
+            self.pending.acquire()
+            self.fetch_pool.submit(self._scrape, url, time.monotonic())
+        self.done.wait()
+        self.fetch_pool.shutdown()
+        self.llm_pool.shutdown()
+        if self.pdf_batcher:
+            self.pdf_batcher.close()
+            self.pdf_renderer.close()
+        if self.asset_auditor:
+            self.asset_auditor.close()
+        self.session.close()
+        return self.finished, self.failed
+
+    # run() waits for one _finish() per URL, so every path through _scrape
+    # and _analyze ends in one, or hands the site on to the next stage
+    def _scrape(self, url, started):
+        stage = 'scrape'
+        try:
+            site_data = fetch_site_data(url, self.session, self.cache)
+            stage = 'scores'
+            assets = None
+            if self.asset_auditor:
+                try:
+                    assets = self.asset_auditor.audit(site_data)
+                    # The per-asset probe list is too bulky for the results file
+                    assets.pop('assets')
+                except Exception as e:
+                    print(f"asset audit failed for {url}: {e}", file=sys.stderr)
+            scores = calculate_scores(site_data, assets)
+            if self.skip_analysis:
+                record = self._record(url, site_data, assets, scores, None)
+            else:
+                stage = 'analysis'
+                self.llm_pool.submit(self._analyze, url, site_data, assets, scores, started)
+                return
+        except Exception as e:
+            record = {'url': url, 'status': 'error', 'stage': stage, 'error': str(e)}
+        self._finish(record, started)
+
+    def _analyze(self, url, site_data, assets, scores, started):
+        try:
+            analysis = generate_analysis(site_data)
+            if analysis.startswith("Error generating analysis"):
+                raise RuntimeError(analysis)
+            record = self._record(url, site_data, assets, scores, analysis)
+        except Exception as e:
+            record = {'url': url, 'status': 'error', 'stage': 'analysis', 'error': str(e)}
+        if self.pdf_batcher and record['status'] == 'ok':
+            try:
+                html = generate_html_report(site_data, analysis, scores, generate_summary(analysis, scores))
+                if html:
+                    # The record is written once its PDF is on disk
+                    self.pdf_batcher.submit(html, lambda pdf, error: self._save_pdf(record, pdf, error, started))
+                    return
+                record['pdf_error'] = "Error generating HTML report"
+            except Exception as e:
+                record['pdf_error'] = str(e)
+        self._finish(record, started)
+
+    def _save_pdf(self, record, pdf, error, started):
+        if pdf is not None:
+            path = os.path.join(self.pdf_dir, pdf_filename(record['url']))
+            try:
+                with open(path, 'wb') as f:
+                    f.write(pdf)
+                record['pdf'] = path
+            except OSError as e:
+                error = str(e)
+        if error:
+            record['pdf_error'] = error
+        self._finish(record, started)
+
+    def _record(self, url, site_data, assets, scores, analysis):
+        changes = None
+        if self.history:
+            try:
+                changes = self.history.save_snapshot(site_data, scores, analysis, assets)['diff']
+            except Exception as e:
+                print(f"could not save history for {url}: {e}", file=sys.stderr)
+        if not self.include_content:
+            site_data = {k: v for k, v in site_data.items() if k != 'content'}
+        return {
+            'url': url, 'status': 'ok', 'site_data': site_data, 'assets': assets, 'scores': scores,
+            'analysis': analysis, 'changes': changes,
+        }
+
+    def _finish(self, record, started):
+        record['elapsed'] = round(time.monotonic() - started, 3)
+        try:
+            self.writer.write(record)
+        finally:
+            with self.lock:
+                self.finished += 1
+                if record['status'] != 'ok':
+                    self.failed += 1
+                count = self.finished
+                if count == self.total:
+                    self.done.set()
+            self.pending.release()
+            print(f"[{count}/{self.total}] {record['status']:5} {record['url']} ({record['elapsed']}s)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run CRO audits for every URL in a file and write JSONL results.")
+    parser.add_argument('input', help="URL list (.txt one per line, .csv with a 'url' column, or .jsonl)")
+    parser.add_argument('-o', '--output', default='audit_results.jsonl', help="JSONL output file; existing successful results are skipped")
+    parser.add_argument('--fetch-concurrency', type=int, default=50, help="parallel page downloads")
+    parser.add_argument('--llm-concurrency', type=int, default=GEMINI_CONCURRENCY,
+                        help="max Gemini calls in flight, counting each analysis's parallel map calls")
+    parser.add_argument('--skip-analysis', action='store_true', help="only scrape and score, no LLM calls")
+    parser.add_argument('--include-content', action='store_true', help="keep the full page text in each record")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="scrape cache shared with the Streamlit app")
+    parser.add_argument('--no-cache', action='store_true', help="always download pages from scratch")
+    parser.add_argument('--pdf-dir', help="also render each report to a PDF in this directory")
+    parser.add_argument('--pdf-workers', type=int, default=PDF_WORKERS, help="parallel PDF renderers")
+    parser.add_argument('--trace-file', help="append a JSON line per traced stage (scrape, analysis, pdf, ...) to this file")
+    parser.add_argument('--metrics-file', help="write stage timings in Prometheus text format here when done")
+    parser.add_argument('--no-history', action='store_true', help="don't record these audits in the audit history")
+    parser.add_argument('--skip-assets', action='store_true', help="don't probe images/CSS/JS/fonts for performance and security scores")
+    args = parser.parse_args(argv)
+
+    urls = read_urls(args.input)
+    completed = load_completed(args.output)
+    todo = [url for url in urls if url not in completed]
+    print(f"{len(urls)} URLs, {len(urls) - len(todo)} already done, {len(todo)} to audit", file=sys.stderr)
+    if not todo:
+        return 0
+
+    if args.trace_file or args.metrics_file:
+        tracer.enable(args.trace_file)
+    writer = JsonlWriter(args.output)
+    try:
+        auditor = BulkAuditor(
+            writer,
+            fetch_concurrency=args.fetch_concurrency,
+            llm_concurrency=args.llm_concurrency,
+            skip_analysis=args.skip_analysis,
+            include_content=args.include_content,
+            cache=None if args.no_cache else ScrapeCache(args.cache_dir),
+            audit_assets=not args.skip_assets,
+            pdf_dir=None if args.skip_analysis else args.pdf_dir,
+            pdf_workers=args.pdf_workers,
+            history=not args.no_history,
+        )
+        start = time.monotonic()
+        finished, failed = auditor.run(todo)
+    finally:
+        writer.close()
+
+    elapsed = time.monotonic() - start
+    if args.metrics_file:
+        with open(args.metrics_file, 'w', encoding='utf-8') as f:
+            f.write(tracer.prometheus())
+    print(f"Audited {finished} sites ({failed} failed) in {elapsed:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import hashlib
+import threading
+import time
+
+# Deterministic stand-in for genai.GenerativeModel, for tests, benchmarks
+# and running the app offline (CRO_FAKE_LLM=1). It implements the one method
+# the app uses, generate_content(prompt, stream=False), and answers with text
+# derived from a hash of the prompt, so the same prompt always gets the same
+# reply. Latency, streaming speed and rate-limit errors are configurable.
+
+
+class FakeRateLimitError(Exception):
+    pass
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, latency=0.0, chunk_delay=0.0, reply_words=80, fail_first=0):
+        # latency: seconds before the first chunk; chunk_delay: seconds between
+        # streamed chunks; fail_first: raise a 429-style error on that many calls
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.reply_words = reply_words
+        self.fail_first = fail_first
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def reply(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        words = [f"finding-{digest[i % 60:i % 60 + 4]}" for i in range(self.reply_words)]
+        lines = [' '.join(words[i:i + 10]) for i in range(0, len(words), 10)]
+        return f"## Fake analysis {digest[:12]}\n\n" + '\n'.join(f"- {line}" for line in lines)
+
+    def generate_content(self, prompt, stream=False):
+        with self.lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+            fail = self.calls <= self.fail_first
+        if fail:
+            raise FakeRateLimitError("429 Resource has been exhausted (fake)")
+        time.sleep(self.latency)
+        text = self.reply(prompt)
+        if not stream:
+            return FakeResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        lines = text.splitlines(keepends=True)
+        for i in range(0, len(lines), 2):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield FakeResponse(''.join(lines[i:i + 2]))
@@ -6,11 +6,40 @@ import html2canvas from 'html2canvas';
 import jsPDF from 'jspdf';
 import './App.css';
 
+const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+
+// Stages of one audit on the server (see backend/jobs.py)
+const STAGE_COUNT = 7;
+
+// Resolves with the finished job once the server reports it done; calls
+// onProgress with each status update while it runs
+const waitForJob = (jobId, onProgress) =>
+  new Promise((resolve, reject) => {
+    const events = new EventSource(`${API_URL}/jobs/${jobId}/events`);
+    const update = (e) => onProgress(JSON.parse(e.data));
+    events.addEventListener('queued', update);
+    events.addEventListener('running', update);
+    events.addEventListener('done', (e) => {
+      events.close();
+      resolve(JSON.parse(e.data));
+    });
+    events.addEventListener('failed', (e) => {
+      events.close();
+      reject(new Error(JSON.parse(e.data).error));
+    });
+    events.onerror = () => {
+      events.close();
+      reject(new Error('Lost connection to the server'));
+    };
+  });
+
 function App() {
   const [url, setUrl] = useState('');
   const [loading, setLoading] = useState(false);
   const [results, setResults] = useState(null);
   const [error, setError] = useState(null);
+  const [progress, setProgress] = useState(null);
+  const [jobId, setJobId] = useState(null);
   
   // Ref for printable content
   const printRef = useRef();
@@ -111,12 +140,21 @@ function App() {
 
     setLoading(true);
     setError(null);
+    setProgress(null);
 
     try {
-      const response = await axios.post('http://localhost:8000/analyze', { url });
+      const submitted = await axios.post(`${API_URL}/jobs`, { url });
+      const job = submitted.data.jobs[0];
+      await waitForJob(job.id, setProgress);
+      const response = await axios.get(`${API_URL}/jobs/${job.id}/result`);
+      setJobId(job.id);
       setResults(response.data);
     } catch (err) {
-      setError('Failed to analyze website. Please try another URL.');
+      if (err.response && err.response.status === 429) {
+        setError('The analyzer is busy right now. Please try again in a few minutes.');
+      } else {
+        setError('Failed to analyze website. Please try another URL.');
+      }
       console.error(err);
     } finally {
       setLoading(false);
@@ -146,7 +184,11 @@ function App() {
       {loading && (
         <div className="loading">
           <div className="spinner"></div>
-          <p>Analyzing website...</p>
+          <p>
+            {!progress || progress.status === 'queued'
+              ? 'Waiting for an analyzer...'
+              : `Analyzing website... (${progress.stages.length} of ${STAGE_COUNT} steps done)`}
+          </p>
         </div>
       )}
 
@@ -290,6 +332,9 @@ function App() {
             <button onClick={handleDownloadPDF} className="download-btn">
               Download PDF
             </button>
+            <a href={`${API_URL}/jobs/${jobId}/report.pdf`} className="download-btn">
+              Download Full Report
+            </a>
           </div>
         </div>
       )}
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from scrape_cache import DEFAULT_CACHE_DIR
+
+# Persistent cache for Gemini analyses plus in-flight de-duplication.
+#
+# Results are keyed on the model name, the prompt template version and a
+# fingerprint of the scraped page, so changing the prompt or the page
+# naturally misses the cache. The SQLite index can be shared between
+# Streamlit workers and bulk runs, like the scrape cache next to it.
+
+DEFAULT_MAX_ENTRIES = int(os.getenv('CRO_ANALYSIS_CACHE_ENTRIES', '5000'))
+DEFAULT_TTL = int(os.getenv('CRO_ANALYSIS_CACHE_TTL', str(30 * 24 * 3600)))
+
+# Page fields that influence the analysis; status, timing and derived
+# counters are left out so they don't cause spurious misses
+FINGERPRINT_FIELDS = ('url', 'title', 'meta_description', 'headers', 'images', 'links', 'content')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses (accessed_at);
+"""
+
+
+# Function to fingerprint the parts of a scraped page the analysis depends on
+def page_fingerprint(site_data):
+    fields = {name: site_data.get(name) for name in FINGERPRINT_FIELDS}
+    encoded = json.dumps(fields, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+# Function to build the cache key for one analysis request
+def analysis_key(model_name, prompt_version, site_data):
+    return f"{model_name}:v{prompt_version}:{page_fingerprint(site_data)}"
+
+
+class AnalysisCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.db_path = os.path.join(directory, 'analysis_cache.sqlite3')
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    # One connection per thread; SQLite handles locking between processes
+    def _db(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    # Cached analysis text, or None if missing or older than the TTL
+    def get(self, key):
+        db = self._db()
+        row = db.execute('SELECT text, created_at FROM analyses WHERE key = ?', (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        db.execute('UPDATE analyses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return row[0]
+
+    def put(self, key, model_name, text):
+        now = time.time()
+        self._db().execute(
+            'INSERT OR REPLACE INTO analyses (key, model, text, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+            (key, model_name, text, now, now),
+        )
+        self.evict()
+
+    # Drop expired entries, then the least recently used beyond max_entries
+    def evict(self):
+        db = self._db()
+        db.execute('DELETE FROM analyses WHERE created_at < ?', (time.time() - self.ttl,))
+        db.execute(
+            'DELETE FROM analyses WHERE key IN '
+            '(SELECT key FROM analyses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+
+
+# Lets concurrent identical requests share one call: the first caller for a
+# key becomes the leader and does the work, everyone else waits on its Future
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    # Returns (future, is_leader); the leader must call finish() or fail()
+    def begin(self, key):
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self.calls[key] = future
+            return future, True
+
+    def finish(self, key, result):
+        with self.lock:
+            future = self.calls.pop(key, None)
+        if future is not None:
+            future.set_result(result)
+
+    def fail(self, key, error):
+        with self.lock:
+            future = self.calls.pop(key, None)
+        if future is not None:
+            future.set_exception(error)
+
+    def do(self, key, fn):
+        future, leader = self.begin(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.finish(key, result)
+        return result
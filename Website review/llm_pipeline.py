@@ -0,0 +1,376 @@
+import contextlib
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Map-reduce analysis of a scraped page.
+#
+# The page is split into token-budgeted chunks (heading blocks, plus image and
+# link summaries). Each chunk is reviewed by the model in parallel ("map"),
+# and the partial findings are combined with the full audit prompt into the
+# final report ("reduce"). The total input is capped, so long pages cost
+# about as much as medium ones. All calls go through a RateLimiter with
+# requests-per-minute and tokens-per-minute buckets and a cap on calls in
+# flight (shared by the parallel map calls of every analysis), and are
+# retried with jittered exponential backoff on rate-limit and transient errors.
+#
+# `model` is anything with generate_content(prompt, stream=False) returning
+# objects with .text -- the Gemini model or fake_llm.FakeModel.
+
+CHUNK_TOKENS = int(os.getenv('CRO_CHUNK_TOKENS', '1500'))
+MAX_CHUNKS = int(os.getenv('CRO_MAX_CHUNKS', '8'))
+MAP_WORKERS = int(os.getenv('CRO_MAP_WORKERS', '4'))
+# Expected reply sizes, reserved from the tokens-per-minute budget up front
+MAP_OUTPUT_TOKENS = 300
+REDUCE_OUTPUT_TOKENS = 2000
+# Smallest slice of text kept per section when a page has to be trimmed
+MIN_SECTION_TOKENS = 40
+
+RETRYABLE_ERRORS = (
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'DeadlineExceeded',
+    'InternalServerError', 'FakeRateLimitError',
+)
+
+
+# Rough token count: ~4 characters per token for English prose
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+# Token counts for one response: the API's usage metadata when it has it,
+# otherwise estimates from the text
+def usage_tokens(response, prompt, text):
+    usage = getattr(response, 'usage_metadata', None)
+    input_tokens = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt)
+    output_tokens = getattr(usage, 'candidates_token_count', None) or estimate_tokens(text)
+    return input_tokens, output_tokens
+
+# Function to fingerprint one unit of page content
+def unit_fingerprint(kind, heading, text):
+    return hashlib.sha256(f"{kind}\0{heading}\0{text}".encode('utf-8')).hexdigest()[:16]
+
+
+# Token bucket refilled continuously at `per_minute` tokens per minute
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Seconds until `amount` tokens are available, reserving them if so
+    def _reserve(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            amount = min(amount, self.capacity)
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0
+            return (amount - self.tokens) / self.rate
+
+    # Blocks until `amount` tokens are available; returns the time waited
+    def acquire(self, amount=1):
+        waited = 0.0
+        while True:
+            delay = self._reserve(amount)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    # max_concurrent caps model calls in flight at once (0 = no cap)
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrent=0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.set_max_concurrent(max_concurrent)
+
+    # Only call this before the limiter is in use
+    def set_max_concurrent(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self.slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def acquire(self, tokens):
+        return self.requests.acquire(1) + self.tokens.acquire(tokens)
+
+    # Waits for a free call slot; returns the seconds waited
+    def start_call(self):
+        if self.slots is None:
+            return 0.0
+        start = time.perf_counter()
+        self.slots.acquire()
+        return time.perf_counter() - start
+
+    def end_call(self):
+        if self.slots is not None:
+            self.slots.release()
+
+
+def is_retryable(error):
+    return (
+        type(error).__name__ in RETRYABLE_ERRORS
+        or isinstance(error, (TimeoutError, ConnectionError))
+        or '429' in str(error)
+    )
+
+# Function to call fn, retrying retryable errors with full-jitter backoff
+def call_with_retry(fn, retries=5, base_delay=1.0, max_delay=30.0):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+# Function to break a page into prompt-sized units: one per heading block
+# (long blocks are split), plus an image summary and a link summary
+def page_units(site_data):
+    units = []
+    for section in site_data.get('sections', []):
+        heading = section['heading'] or '(top of page)'
+        title = f"{section['level'].upper()} {heading}" if section['level'] else heading
+        units.append({'kind': 'section', 'heading': title, 'text': section['text']})
+
+    images = site_data.get('images', [])
+    if images:
+        missing = [img['src'] for img in images if not img['alt']]
+        alts = [img['alt'][:80] for img in images if img['alt']]
+        text = (
+            f"{len(images)} images, {len(alts)} with alt text. "
+            + (f"Missing alt text (first 20): {', '.join(missing[:20])}. " if missing else '')
+            + (f"Alt texts (first 30): {'; '.join(alts[:30])}" if alts else '')
+        )
+        units.append({
+            'kind': 'images', 'heading': 'Images', 'text': text,
+            # The text only samples the images; fingerprint the whole set
+            'fingerprint': unit_fingerprint('images', '', repr(sorted((img['src'], img['alt']) for img in images))),
+        })
+
+    links = site_data.get('links', [])
+    if links:
+        host = urlsplit(site_data['url']).netloc
+        external = [link for link in links if link.startswith(('http://', 'https://')) and urlsplit(link).netloc != host]
+        text = (
+            f"{len(links)} links, {len(external)} external. "
+            f"Sample: {', '.join(links[:40])}"
+        )
+        units.append({
+            'kind': 'links', 'heading': 'Links', 'text': text,
+            'fingerprint': unit_fingerprint('links', '', repr(sorted(set(links)))),
+        })
+
+    for unit in units:
+        if 'fingerprint' not in unit:
+            unit['fingerprint'] = unit_fingerprint(unit['kind'], unit['heading'], unit['text'])
+    return units
+
+# Function to trim every unit proportionally so the page fits max_tokens.
+# Image/link summaries are always kept; if even the minimum slice of every
+# section doesn't fit, sections late in the page are dropped.
+def fit_budget(units, max_tokens):
+    def cost(unit):
+        return estimate_tokens(unit['heading']) + estimate_tokens(unit['text'])
+
+    total = sum(cost(u) for u in units)
+    if total <= max_tokens:
+        return units
+    summary_cost = sum(cost(u) for u in units if u['kind'] != 'section')
+    budget = max_tokens - summary_cost
+    ratio = budget / max(1, total - summary_cost)
+    trimmed = []
+    for unit in units:
+        if unit['kind'] != 'section':
+            trimmed.append(unit)
+            continue
+        text_tokens = estimate_tokens(unit['text'])
+        keep = min(text_tokens, max(MIN_SECTION_TOKENS, int(text_tokens * ratio)))
+        needed = estimate_tokens(unit['heading']) + keep
+        if needed > budget:
+            continue
+        budget -= needed
+        trimmed.append(dict(unit, text=unit['text'][:keep * 4]))
+    return trimmed
+
+# Function to pack units into chunks of at most chunk_tokens, in page order;
+# a unit bigger than a chunk is split across several
+def build_chunks(units, chunk_tokens=CHUNK_TOKENS, max_chunks=MAX_CHUNKS):
+    # Leave headroom for the per-unit headings added when rendering
+    units = fit_budget(units, int(chunk_tokens * max_chunks * 0.9))
+    chunks = []
+    current = {'units': [], 'tokens': 0}
+    for unit in units:
+        text = unit['text']
+        limit = chunk_tokens * 4
+        pieces = [text[i:i + limit] for i in range(0, len(text), limit)] or ['']
+        for piece in pieces:
+            tokens = estimate_tokens(unit['heading']) + estimate_tokens(piece)
+            if current['units'] and current['tokens'] + tokens > chunk_tokens:
+                chunks.append(current)
+                current = {'units': [], 'tokens': 0}
+            current['units'].append(dict(unit, text=piece))
+            current['tokens'] += tokens
+    if current['units']:
+        chunks.append(current)
+    for chunk in chunks:
+        chunk['fingerprints'] = sorted({u['fingerprint'] for u in chunk['units']})
+    return chunks
+
+# Function to pick the chunks of a previous analysis whose units are all still
+# on the page unchanged, so their findings can be reused; the other units
+# are packed into new chunks. Chunks come back in page order, reused ones
+# with their 'findings' already set.
+def reuse_chunks(units, previous, chunk_tokens=CHUNK_TOKENS, max_chunks=MAX_CHUNKS):
+    position = {}
+    for i, unit in enumerate(units):
+        position.setdefault(unit['fingerprint'], i)
+    reused = []
+    covered = set()
+    for chunk in previous:
+        # A long unit split over several chunks appears in each of them, and
+        # each keeps the findings for its own piece
+        fingerprints = set(chunk['fingerprints'])
+        if fingerprints and fingerprints <= position.keys():
+            reused.append(dict(chunk, reused=True))
+            covered |= fingerprints
+    remaining = [unit for unit in units if unit['fingerprint'] not in covered]
+    fresh = build_chunks(remaining, chunk_tokens, max(1, max_chunks - len(reused))) if remaining else []
+    first = lambda chunk: min(position.get(fp, len(units)) for fp in chunk['fingerprints'])
+    return sorted(reused + fresh, key=first)
+
+def render_chunk(chunk):
+    return '\n\n'.join(f"### {u['heading']}\n{u['text']}" for u in chunk['units'])
+
+def map_prompt(site_data, chunk, index, count):
+    return f"""
+    You are reviewing part {index + 1} of {count} of the page {site_data['url']} (title: "{site_data['title']}")
+    for a website optimization audit covering performance, SEO, UX, content, accessibility,
+    security and conversion.
+
+    List the concrete issues and strengths you can see in this part of the page only:
+    weak or missing headings, unclear calls to action, thin or duplicated copy, missing alt
+    text, trust signals, readability problems and SEO gaps. Quote the text you refer to.
+    Be brief: at most 10 bullet points.
+
+    Page content:
+    {render_chunk(chunk)}
+    """
+
+
+class MapReduceAnalyzer:
+    def __init__(self, model, limiter=None, max_workers=MAP_WORKERS, chunk_tokens=CHUNK_TOKENS, max_chunks=MAX_CHUNKS):
+        self.model = model
+        self.limiter = limiter
+        self.max_workers = max_workers
+        self.chunk_tokens = chunk_tokens
+        self.max_chunks = max_chunks
+        # Totals over every call this analyzer made, for tracing
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'queue_wait': 0.0, 'input_tokens': 0, 'output_tokens': 0, 'reused_chunks': 0}
+        self.mapped_chunks = []
+
+    def _count(self, queue_wait=0.0, input_tokens=0, output_tokens=0, calls=0):
+        with self.lock:
+            self.stats['calls'] += calls
+            self.stats['queue_wait'] += queue_wait
+            self.stats['input_tokens'] += input_tokens
+            self.stats['output_tokens'] += output_tokens
+
+    # `previous` is the chunk list of an earlier analysis of the same page
+    # (see chunk_records); chunks that haven't changed keep their findings
+    def chunks(self, site_data, previous=None):
+        units = page_units(site_data)
+        if previous:
+            return reuse_chunks(units, previous, self.chunk_tokens, self.max_chunks)
+        return build_chunks(units, self.chunk_tokens, self.max_chunks)
+
+    # Holds one of the limiter's concurrent-call slots for the duration of
+    # a model call (for streamed replies, until the stream is consumed)
+    @contextlib.contextmanager
+    def _slot(self):
+        if not self.limiter:
+            yield
+            return
+        self._count(queue_wait=self.limiter.start_call())
+        try:
+            yield
+        finally:
+            self.limiter.end_call()
+
+    # Callers hold a _slot() around this and, for streams, the iteration
+    def _generate(self, prompt, output_tokens, stream=False):
+        def call():
+            if self.limiter:
+                self._count(queue_wait=self.limiter.acquire(estimate_tokens(prompt) + output_tokens))
+            return self.model.generate_content(prompt, stream=stream)
+        response = call_with_retry(call)
+        self._count(calls=1)
+        if not stream:
+            self._count(0.0, *usage_tokens(response, prompt, response.text))
+        return response
+
+    # Map step: review each chunk in parallel; returns one findings string per
+    # chunk and stores it on the chunk. Chunks that already have findings
+    # (reused from a previous analysis) are not sent to the model.
+    def map(self, site_data, chunks):
+        todo = [chunk for chunk in chunks if 'findings' not in chunk]
+        if todo:
+            prompts = [map_prompt(site_data, chunk, i, len(todo)) for i, chunk in enumerate(todo)]
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='llm-map') as pool:
+                for chunk, text in zip(todo, pool.map(self._map_call, prompts)):
+                    chunk['findings'] = text
+        self.stats['reused_chunks'] = len(chunks) - len(todo)
+        self.mapped_chunks = chunks
+        return [chunk['findings'] for chunk in chunks]
+
+    def _map_call(self, prompt):
+        with self._slot():
+            return self._generate(prompt, MAP_OUTPUT_TOKENS).text
+
+    # Function to strip the last mapped chunks down to what a later analysis
+    # needs to reuse them: unit headings and fingerprints, and the findings
+    def chunk_records(self):
+        return [
+            {
+                'units': [{'heading': u['heading'], 'fingerprint': u['fingerprint']} for u in chunk['units']],
+                'fingerprints': chunk['fingerprints'],
+                'findings': chunk['findings'],
+            }
+            for chunk in self.mapped_chunks if 'findings' in chunk
+        ]
+
+    # Reduce step: one call with the full audit prompt and all findings.
+    # With stream=True, returns an iterator of text chunks; the call is made
+    # when iteration starts.
+    def reduce(self, reduce_prompt, stream=False):
+        if stream:
+            return self._stream(reduce_prompt)
+        with self._slot():
+            return self._generate(reduce_prompt, REDUCE_OUTPUT_TOKENS).text
+
+    def _stream(self, prompt):
+        parts = []
+        chunk = None
+        with self._slot():
+            for chunk in self._generate(prompt, REDUCE_OUTPUT_TOKENS, stream=True):
+                parts.append(chunk.text)
+                yield chunk.text
+        # The last chunk carries the usage metadata for the whole response
+        self._count(0.0, *usage_tokens(chunk, prompt, ''.join(parts)))
+
+    # Function to combine partial findings into the text inserted in the reduce prompt
+    @staticmethod
+    def findings(chunks, partials):
+        return '\n\n'.join(
+            f"Findings for {', '.join(u['heading'] for u in chunk['units'][:3])}"
+            f"{' ...' if len(chunk['units']) > 3 else ''}:\n{partial.strip()}"
+            for chunk, partial in zip(chunks, partials)
+        )
@@ -0,0 +1,227 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from llm_cache import SingleFlight
+from scrape_cache import DEFAULT_CACHE_DIR
+
+# HTML-to-PDF rendering for the audit reports.
+#
+# PDFs are only rendered when someone asks for one (the download button or
+# bulk_audit.py --pdf-dir) and are cached on disk under the SHA-256 of the
+# report HTML, so the same report is never rendered twice. Renders run on a
+# bounded pool: wkhtmltopdf already runs in its own process, so it gets a
+# thread pool that caps how many are alive at once; xhtml2pdf is pure Python
+# and CPU-bound, so it gets a pool of worker processes that render whole
+# batches of reports and are recycled regularly to bound their memory.
+#
+# CRO_PDF_BACKEND picks the backend: 'auto' (default; wkhtmltopdf if it's on
+# PATH, otherwise xhtml2pdf), 'wkhtmltopdf' or 'xhtml2pdf'.
+
+PDF_BACKEND = os.getenv('CRO_PDF_BACKEND', 'auto')
+PDF_WORKERS = int(os.getenv('CRO_PDF_WORKERS', '2'))
+DEFAULT_MAX_BYTES = int(os.getenv('CRO_PDF_CACHE_MB', '256')) * 1024 * 1024
+# Reports rendered by one xhtml2pdf worker before it is replaced
+TASKS_PER_WORKER = 50
+WKHTMLTOPDF_OPTIONS = {'quiet': '', 'encoding': 'UTF-8'}
+
+
+# Function to pick the backend to use, failing early if none is available
+def resolve_backend(backend=PDF_BACKEND):
+    if backend not in ('auto', 'wkhtmltopdf', 'xhtml2pdf'):
+        raise ValueError(f"Unknown PDF backend '{backend}'")
+    if backend in ('auto', 'wkhtmltopdf') and shutil.which('wkhtmltopdf'):
+        return 'wkhtmltopdf'
+    if backend == 'wkhtmltopdf':
+        raise RuntimeError("wkhtmltopdf is not installed; install it or set CRO_PDF_BACKEND=xhtml2pdf")
+    try:
+        import xhtml2pdf  # noqa: F401
+    except ImportError:
+        raise RuntimeError("No PDF backend available: install wkhtmltopdf or `pip install xhtml2pdf`")
+    return 'xhtml2pdf'
+
+def html_hash(html):
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+def render_html(backend, html):
+    if backend == 'wkhtmltopdf':
+        import pdfkit
+        return pdfkit.from_string(html, False, options=WKHTMLTOPDF_OPTIONS)
+    from xhtml2pdf import pisa
+    output = io.BytesIO()
+    status = pisa.CreatePDF(html, dest=output, encoding='utf-8')
+    if status.err:
+        raise RuntimeError(f"xhtml2pdf reported {status.err} error(s)")
+    return output.getvalue()
+
+# Renders several reports in one worker; one bad report doesn't fail the rest.
+# Returns (pdf, error message) pairs in input order.
+def render_batch(backend, htmls):
+    results = []
+    for html in htmls:
+        try:
+            results.append((render_html(backend, html), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+# Rendered PDFs on disk, named by the hash of their HTML and evicted
+# least-recently-used first once the directory grows past max_bytes
+class PdfCache:
+    def __init__(self, directory=os.path.join(DEFAULT_CACHE_DIR, 'pdf'), max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pdf')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                pdf = f.read()
+            os.utime(path)
+            return pdf
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, pdf):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class PdfRenderer:
+    def __init__(self, backend=PDF_BACKEND, max_workers=PDF_WORKERS, cache=None):
+        self.backend = resolve_backend(backend)
+        self.max_workers = max_workers
+        self.cache = cache or PdfCache()
+        self.inflight = SingleFlight()
+        if self.backend == 'wkhtmltopdf':
+            self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf')
+        else:
+            # spawn, not fork: the parent is multi-threaded
+            self.pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                max_tasks_per_child=TASKS_PER_WORKER,
+            )
+
+    # Function to render one report, from the cache if it was rendered before;
+    # concurrent requests for the same report share one render
+    def render(self, html):
+        key = html_hash(html)
+        pdf = self.cache.get(key)
+        if pdf is not None:
+            return pdf
+
+        def call():
+            [(pdf, error)] = self.pool.submit(render_batch, self.backend, [html]).result()
+            if error:
+                raise RuntimeError(error)
+            self.cache.put(key, pdf)
+            return pdf
+        return self.inflight.do(key, call)
+
+    # Function to render many reports, split into one batch per worker.
+    # Returns (pdf, error message) pairs in input order.
+    def render_many(self, htmls):
+        keys = [html_hash(html) for html in htmls]
+        results = [(self.cache.get(key), None) for key in keys]
+        todo = [i for i, (pdf, _) in enumerate(results) if pdf is None]
+        if not todo:
+            return results
+        size = -(-len(todo) // self.max_workers)
+        batches = [todo[i:i + size] for i in range(0, len(todo), size)]
+        futures = [self.pool.submit(render_batch, self.backend, [htmls[i] for i in batch]) for batch in batches]
+        for batch, future in zip(batches, futures):
+            try:
+                rendered = future.result()
+            except Exception as e:
+                rendered = [(None, f"{type(e).__name__}: {e}")] * len(batch)
+            for i, (pdf, error) in zip(batch, rendered):
+                if pdf is not None:
+                    self.cache.put(keys[i], pdf)
+                results[i] = (pdf, error)
+        return results
+
+    def close(self):
+        self.pool.shutdown()
+
+
+# Collects reports submitted one at a time (e.g. by bulk audit workers) and
+# renders them with render_many once batch_size are waiting or the oldest
+# has waited max_wait seconds. callback(pdf, error) runs on the batch thread;
+# an exception it raises is logged and the next report's callback still runs.
+class PdfBatcher:
+    def __init__(self, renderer, batch_size=8, max_wait=5.0):
+        self.renderer = renderer
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='pdf-batch', daemon=True)
+        self.thread.start()
+
+    def submit(self, html, callback):
+        self.queue.put((html, callback))
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                results = self.renderer.render_many([html for html, _ in batch])
+            except Exception as e:
+                results = [(None, f"{type(e).__name__}: {e}")] * len(batch)
+            for (_, callback), (pdf, error) in zip(batch, results):
+                try:
+                    callback(pdf, error)
+                except Exception as e:
+                    # One failing callback mustn't stop the reports queued behind it
+                    print(f"PDF callback failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    # Renders whatever is still waiting, then stops the batch thread
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,92 @@
+import contextvars
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Small dependency-graph executor for the analysis stages.
+#
+# Each stage is a function whose positional arguments are the results of the
+# stages it depends on. A stage is submitted to the thread pool as soon as all
+# of its inputs are ready, and run() yields events in completion order so the
+# caller can render each result the moment it exists:
+#
+#   ('done', name, result)    stage finished
+#   ('failed', name, error)   stage raised, or one of its inputs failed
+#   ('partial', name, value)  progress a stage published with emit()
+#
+# Closing the run() generator early cancels stages that haven't started.
+# Stages run in a copy of the caller's context, so context variables (like
+# the current tracing span) carry over into the worker threads.
+
+
+class StagePipeline:
+    def __init__(self, max_workers=4, initializer=None):
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.stages = {}
+        self.events = queue.Queue()
+        self.timings = {}
+
+    def add(self, name, fn, deps=()):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = (fn, tuple(deps))
+
+    # Called from inside a running stage to publish intermediate output
+    def emit(self, name, value):
+        self.events.put(('partial', name, value))
+
+    def _run_stage(self, name, fn, args):
+        start = time.perf_counter()
+        try:
+            event = ('done', name, fn(*args))
+        except Exception as e:
+            event = ('failed', name, e)
+        self.timings[name] = time.perf_counter() - start
+        self.events.put(event)
+
+    def run(self):
+        pending = dict(self.stages)
+        results = {}
+        failed = set()
+        running = 0
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='stage',
+            initializer=self.initializer,
+        )
+        try:
+            while True:
+                # Start everything whose inputs are ready; fail everything
+                # downstream of a failure
+                changed = True
+                while changed:
+                    changed = False
+                    for name, (fn, deps) in list(pending.items()):
+                        broken = [dep for dep in deps if dep in failed]
+                        if broken:
+                            del pending[name]
+                            failed.add(name)
+                            changed = True
+                            yield 'failed', name, RuntimeError(f"Stage '{broken[0]}' failed")
+                        elif all(dep in results for dep in deps):
+                            del pending[name]
+                            executor.submit(
+                                contextvars.copy_context().run,
+                                self._run_stage, name, fn, [results[dep] for dep in deps],
+                            )
+                            running += 1
+                if not running:
+                    break
+
+                kind, name, value = self.events.get()
+                if kind == 'done':
+                    results[name] = value
+                    running -= 1
+                elif kind == 'failed':
+                    failed.add(name)
+                    running -= 1
+                yield kind, name, value
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+# Disk-backed cache for scraped pages.
+#
+# The index (extracted data, ETag/Last-Modified validators, timestamps) lives
+# in a SQLite database in WAL mode so several Streamlit workers and batch runs
+# can share one cache directory. Raw bodies are stored zlib-compressed under
+# their SHA-256, so a page that comes back unchanged is only stored once, and
+# are kept so a page can be re-extracted without downloading it again when
+# the extractor changes (data_version). The size limit counts both the
+# compressed body and the extracted data.
+
+DEFAULT_CACHE_DIR = os.getenv('CRO_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'cro_reviewer'))
+DEFAULT_MAX_BYTES = int(os.getenv('CRO_SCRAPE_CACHE_MB', '512')) * 1024 * 1024
+DEFAULT_TTL = int(os.getenv('CRO_SCRAPE_CACHE_TTL', str(7 * 24 * 3600)))
+
+# Body files younger than this are never garbage collected, so a writer in
+# another process has time to insert the row that references its file
+ORPHAN_GRACE_SECONDS = 300
+# Each process scans the body directory for orphans at most this often
+GC_INTERVAL_SECONDS = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    body_hash TEXT,
+    body_size INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    data_version INTEGER NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at);
+"""
+
+
+# Streams a response body to a temporary file while hashing it; commit()
+# moves it into the content-addressed store and returns the hash
+class BodyWriter:
+    def __init__(self, cache):
+        self.cache = cache
+        self.digest = hashlib.sha256()
+        self.compressor = zlib.compressobj()
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.body_dir, suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb')
+        # Compressed bytes on disk, counted in the cache size limit
+        self.size = 0
+
+    def _write(self, compressed):
+        self.file.write(compressed)
+        self.size += len(compressed)
+
+    def tee(self, chunks):
+        for chunk in chunks:
+            if chunk:
+                self.digest.update(chunk)
+                self._write(self.compressor.compress(chunk))
+            yield chunk
+
+    def commit(self):
+        self._write(self.compressor.flush())
+        self.file.close()
+        body_hash = self.digest.hexdigest()
+        path = self.cache.body_path(body_hash)
+        if os.path.exists(path):
+            # Same body already stored; refresh its mtime for the GC grace period
+            os.remove(self.tmp_path)
+            os.utime(path)
+        else:
+            os.replace(self.tmp_path, path)
+        return body_hash
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ScrapeCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.body_dir = os.path.join(directory, 'bodies')
+        self.db_path = os.path.join(directory, 'scrape_cache.sqlite3')
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.local = threading.local()
+        self.gc_lock = threading.Lock()
+        # First put() in each process collects, later ones every GC_INTERVAL_SECONDS
+        self.next_gc = 0
+        os.makedirs(self.body_dir, exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    # One connection per thread; SQLite handles locking between processes
+    def _db(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def body_path(self, body_hash):
+        return os.path.join(self.body_dir, body_hash + '.z')
+
+    # Cached entry for url, or None if missing or older than the TTL
+    def get(self, url):
+        row = self._db().execute(
+            'SELECT data, data_version, content_type, etag, last_modified, fetched_at, body_hash, body_size '
+            'FROM pages WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, data_version, content_type, etag, last_modified, fetched_at, body_hash, body_size = row
+        if time.time() - fetched_at > self.ttl:
+            return None
+        return {
+            'data': json.loads(data),
+            'data_version': data_version,
+            'content_type': content_type,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+            'body_hash': body_hash,
+            'body_size': body_size,
+        }
+
+    # Request headers that turn the next fetch into a conditional GET
+    def validators(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body_writer(self):
+        return BodyWriter(self)
+
+    # Whether the raw body of an entry is still on disk
+    def has_body(self, entry):
+        return bool(entry.get('body_hash')) and os.path.exists(self.body_path(entry['body_hash']))
+
+    # Decompressed chunks of an entry's stored body, for re-extraction
+    def read_body(self, entry, chunk_size=64 * 1024):
+        decompressor = zlib.decompressobj()
+        with open(self.body_path(entry['body_hash']), 'rb') as f:
+            while True:
+                compressed = f.read(chunk_size)
+                if not compressed:
+                    break
+                chunk = decompressor.decompress(compressed)
+                if chunk:
+                    yield chunk
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    # body_size is the compressed size from BodyWriter; data_version tells
+    # which extractor produced data, content_type is needed to redo it
+    def put(self, url, data, body_hash=None, body_size=0, etag=None, last_modified=None,
+            data_version=0, content_type=None):
+        now = time.time()
+        encoded = json.dumps(data)
+        db = self._db()
+        db.execute(
+            'INSERT OR REPLACE INTO pages (url, body_hash, body_size, size, data, data_version, content_type, '
+            'etag, last_modified, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (url, body_hash, body_size, body_size + len(encoded), encoded, data_version, content_type,
+             etag, last_modified, now, now),
+        )
+        # A plain read in WAL mode, so concurrent writers aren't blocked
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total > self.max_bytes:
+            self.evict()
+        with self.gc_lock:
+            collect = now >= self.next_gc
+            if collect:
+                self.next_gc = now + GC_INTERVAL_SECONDS
+        if collect:
+            self.collect_garbage()
+
+    # Mark an entry as revalidated (304) and recently used
+    def touch(self, url):
+        now = time.time()
+        self._db().execute('UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+
+    # Drop expired entries, then least recently used ones until the cache
+    # fits in max_bytes; their body files go in the next collect_garbage()
+    def evict(self):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM pages WHERE fetched_at < ?', (time.time() - self.ttl,))
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+            if total > self.max_bytes:
+                for url, size in db.execute('SELECT url, size FROM pages ORDER BY accessed_at').fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute('DELETE FROM pages WHERE url = ?', (url,))
+                    total -= size
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    # Delete expired entries and old body files no entry points at any more.
+    # Runs outside any transaction: a body written after the referenced set
+    # was read is younger than the grace period, so it is never removed.
+    def collect_garbage(self):
+        db = self._db()
+        db.execute('DELETE FROM pages WHERE fetched_at < ?', (time.time() - self.ttl,))
+        referenced = {row[0] for row in db.execute('SELECT DISTINCT body_hash FROM pages')}
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for entry in os.scandir(self.body_dir):
+            body_hash = entry.name.rsplit('.', 1)[0]
+            if body_hash in referenced:
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
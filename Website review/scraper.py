@@ -0,0 +1,359 @@
+import codecs
+import re
+import time
+from html.parser import HTMLParser
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from tracing import tracer
+
+# Page download and extraction, shared by the Streamlit app and the headless
+# tools (bulk audit, crawler, asset audit, job API) without pulling in
+# Streamlit or the Gemini client.
+#
+# fetch_site_data() streams the body through PageExtractor in one pass, so a
+# page is never held in memory whole, and revalidates cached pages with a
+# conditional GET when given a ScrapeCache. A page cached by an older
+# extractor is re-extracted from its stored body when the server answers 304.
+
+# Browser-like headers sent with every page request
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Limits for the streaming extractor: stop reading huge pages after
+# MAX_HTML_BYTES and keep at most MAX_TEXT_CHARS of visible text
+MAX_HTML_BYTES = 10 * 1024 * 1024
+MAX_TEXT_CHARS = 500_000
+CHUNK_SIZE = 64 * 1024
+# How much of the start of a page is searched for a <meta charset>
+SNIFF_BYTES = 4096
+# Bump whenever PageExtractor's output changes, so cached pages are
+# re-extracted instead of served as they were first parsed
+EXTRACTOR_VERSION = 2
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+SKIP_TEXT_TAGS = ('script', 'style', 'template')
+FONT_EXTENSIONS = ('.woff2', '.woff', '.ttf', '.otf', '.eot')
+# Tags that start a new line of text, so "<p>a</p><p>b</p>" doesn't read as "ab";
+# headings also end one
+BLOCK_TAGS = ('p', 'div', 'br', 'li', 'tr', 'td', 'th', 'section', 'article', 'header', 'footer', 'nav', 'main', 'aside', 'ul', 'ol', 'table', 'form', 'blockquote')
+
+# Main-response headers kept in site_data for the security audit
+SECURITY_HEADERS = (
+    'Strict-Transport-Security', 'Content-Security-Policy', 'X-Content-Type-Options',
+    'X-Frame-Options', 'Referrer-Policy', 'Permissions-Policy',
+)
+# Fields of site_data that come from the response rather than the body
+RESPONSE_FIELDS = ('status_code', 'url', 'final_url', 'security_headers', 'tls_version')
+
+
+# Single-pass HTML extractor: collects title, meta description, headings,
+# images, links and visible text while the page is fed in chunks, without
+# building a document tree.
+class PageExtractor(HTMLParser):
+    def __init__(self, max_text_chars=MAX_TEXT_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_text_chars = max_text_chars
+        self.title = None
+        self.meta_description = None
+        self.headers = []
+        self.header_types = []
+        self.images = []
+        self.links = []
+        self.assets = []
+        self.text = []
+        self.text_chars = 0
+        self.in_title = False
+        self.title_parts = []
+        self.heading = None
+        self.heading_parts = []
+        self.skip_depth = 0
+        # Heading blocks as [heading, level, start, end] slices of self.text;
+        # text before the first heading is an untitled block
+        self.sections = [['', None, 0, None]]
+
+    def _line_break(self):
+        if not self.skip_depth and self.text_chars < self.max_text_chars:
+            self.text.append('\n')
+            self.text_chars += 1
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS or tag in HEADING_TAGS:
+            self._line_break()
+        if tag in SKIP_TEXT_TAGS:
+            self.skip_depth += 1
+            if tag == 'script':
+                src = dict(attrs).get('src')
+                if src:
+                    self.assets.append({'url': src, 'type': 'script'})
+        elif tag in HEADING_TAGS:
+            if self.heading is None:
+                self.heading = tag
+                self.heading_parts = []
+                self.sections[-1][3] = len(self.text)
+        elif tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href)
+        elif tag == 'img':
+            attrs = dict(attrs)
+            if attrs.get('src'):
+                self.images.append({'src': attrs['src'], 'alt': attrs.get('alt') or ''})
+        elif tag == 'meta':
+            if self.meta_description is None:
+                attrs = dict(attrs)
+                if (attrs.get('name') or '').lower() == 'description' and attrs.get('content') is not None:
+                    self.meta_description = attrs['content'].strip()
+        elif tag == 'link':
+            attrs = dict(attrs)
+            href = attrs.get('href')
+            rel = (attrs.get('rel') or '').lower().split()
+            if not href:
+                return
+            if 'stylesheet' in rel:
+                self.assets.append({'url': href, 'type': 'stylesheet'})
+            elif (attrs.get('as') or '').lower() == 'font' or href.lower().split('?')[0].endswith(FONT_EXTENSIONS):
+                self.assets.append({'url': href, 'type': 'font'})
+        elif tag == 'title':
+            if self.title is None:
+                self.in_title = True
+
+    def handle_startendtag(self, tag, attrs):
+        # <img/>, <meta/> etc. never open a text context
+        if tag == 'script':
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+        elif tag not in SKIP_TEXT_TAGS and tag not in HEADING_TAGS and tag != 'title':
+            self.handle_starttag(tag, attrs)
+
+    def _close_heading(self):
+        heading = ''.join(self.heading_parts).strip()
+        self.headers.append(heading)
+        self.header_types.append(self.heading)
+        self.sections.append([heading, self.heading, len(self.text), None])
+        self.heading = None
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TEXT_TAGS:
+            if self.skip_depth:
+                self.skip_depth -= 1
+        elif tag == self.heading:
+            self._line_break()
+            self._close_heading()
+        elif tag == 'title' and self.in_title:
+            self.title = ''.join(self.title_parts).strip()
+            self.in_title = False
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.in_title:
+            self.title_parts.append(data)
+        if self.heading is not None:
+            self.heading_parts.append(data)
+        if self.text_chars < self.max_text_chars:
+            data = data[:self.max_text_chars - self.text_chars]
+            self.text.append(data)
+            self.text_chars += len(data)
+
+    def result(self):
+        self.close()
+        if self.heading is not None:
+            self._close_heading()
+        if self.title is None and self.title_parts:
+            self.title = ''.join(self.title_parts).strip()
+        sections = []
+        for heading, level, start, end in self.sections:
+            text = ' '.join(''.join(self.text[start:end]).split())
+            if heading or text:
+                sections.append({'heading': heading, 'level': level, 'text': text})
+        return {
+            'title': self.title or 'No title',
+            'meta_description': self.meta_description or 'No meta description',
+            'headers': self.headers,
+            'header_types': self.header_types,
+            'images': self.images,
+            'links': self.links,
+            'assets': self.assets,
+            'sections': sections,
+            'content': ''.join(self.text).strip(),
+        }
+
+
+# Pick the page encoding from the Content-Type header, then a <meta charset>
+# in the first chunk, falling back to UTF-8
+def detect_encoding(content_type, first_chunk):
+    match = re.search(r'charset=["\']?([\w.:-]+)', content_type or '', re.I)
+    if not match:
+        match = re.search(rb'<meta[^>]+charset=["\']?([\w.:-]+)', first_chunk[:SNIFF_BYTES], re.I)
+    if match:
+        name = match.group(1)
+        name = name.decode('ascii', 'ignore') if isinstance(name, bytes) else name
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+# Function to join the leading chunks until there are SNIFF_BYTES (or the
+# body ends), so the charset is found however the body was split
+def sniffable(chunks):
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_BYTES:
+            break
+    if head:
+        yield head
+    yield from chunks
+
+# Feed an iterable of byte chunks through PageExtractor, stopping after
+# max_bytes. Returns the extracted fields plus html_bytes and truncated.
+def extract_page(chunks, content_type=None, max_bytes=MAX_HTML_BYTES, max_text_chars=MAX_TEXT_CHARS):
+    extractor = PageExtractor(max_text_chars)
+    decoder = None
+    total = 0
+    truncated = False
+    for chunk in sniffable(chunks):
+        if not chunk:
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(detect_encoding(content_type, chunk))(errors='replace')
+        if total + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - total]
+            truncated = True
+        total += len(chunk)
+        extractor.feed(decoder.decode(chunk))
+        if truncated:
+            break
+    if decoder is not None:
+        extractor.feed(decoder.decode(b'', final=True))
+
+    data = extractor.result()
+    data['html_bytes'] = total
+    data['truncated'] = truncated
+    return data
+
+# Function to pass chunks through while adding the time spent waiting for
+# each one to timer[0]
+def timed_chunks(chunks, timer):
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        timer[0] += time.perf_counter() - start
+        if chunk is None:
+            return
+        yield chunk
+
+# Function to build a keep-alive session whose connection pool fits
+# `pool_size` concurrent requests
+def make_session(pool_size=10):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# TLS protocol negotiated for a streamed response (e.g. 'TLSv1.3'), if any
+def tls_version(response):
+    try:
+        return response.raw.connection.sock.version()
+    except AttributeError:
+        return None
+
+# Function to add the SEO metrics derived from the extracted fields
+def add_page_metrics(data):
+    data['word_count'] = len(data['content'].split())
+    data['image_count'] = len(data['images'])
+    data['link_count'] = len(data['links'])
+    data['h1_count'] = data['header_types'].count('h1')
+    data['alt_text_coverage'] = len([img for img in data['images'] if img['alt']]) / data['image_count'] if data['image_count'] > 0 else 0
+    return data
+
+# Function to redo the extraction of a cached page from its stored body with
+# the current extractor, keeping the response fields of the fetch that stored it
+def reextract_cached(url, cached, cache, span):
+    start = time.perf_counter()
+    data = extract_page(cache.read_body(cached), cached['content_type'])
+    span.record('scrape.parse', time.perf_counter() - start)
+    for name in RESPONSE_FIELDS:
+        data[name] = cached['data'].get(name)
+    add_page_metrics(data)
+    cache.put(
+        url, data,
+        body_hash=cached['body_hash'],
+        body_size=cached['body_size'],
+        etag=cached['etag'],
+        last_modified=cached['last_modified'],
+        data_version=EXTRACTOR_VERSION,
+        content_type=cached['content_type'],
+    )
+    return data
+
+# Fetch a page and extract its SEO data; raises on network/HTTP errors.
+# Pass a requests.Session to reuse pooled keep-alive connections, and a
+# ScrapeCache to revalidate previously scraped pages with a conditional GET.
+def fetch_site_data(url, session=None, cache=None):
+    with tracer.span('scrape', url=url) as span:
+        http = session or requests
+        cached = cache.get(url) if cache else None
+        if cached and cached['data_version'] != EXTRACTOR_VERSION and not cache.has_body(cached):
+            # Extracted by an older extractor, with nothing to re-extract from
+            cached = None
+        request_headers = {**DEFAULT_HEADERS, **cache.validators(cached)} if cached else DEFAULT_HEADERS
+
+        start = time.perf_counter()
+        with http.get(url, headers=request_headers, timeout=10, stream=True) as response:
+            # DNS, connection setup, TLS handshake and time to first byte
+            span.record('scrape.connect', time.perf_counter() - start)
+            if cached and response.status_code == 304:
+                if cached['data_version'] != EXTRACTOR_VERSION:
+                    span.set(cache='re-extracted')
+                    return reextract_cached(url, cached, cache, span)
+                span.set(cache='revalidated')
+                cache.touch(url)
+                return cached['data']
+            response.raise_for_status()
+            # Read before the body so the connection hasn't gone back to the pool
+            negotiated_tls = tls_version(response)
+
+            chunks = response.iter_content(CHUNK_SIZE)
+            transfer = [0.0]
+            if tracer.active():
+                chunks = timed_chunks(chunks, transfer)
+            body = cache.body_writer() if cache else None
+            start = time.perf_counter()
+            try:
+                data = extract_page(body.tee(chunks) if body else chunks, response.headers.get('Content-Type'))
+            except Exception:
+                if body:
+                    body.discard()
+                raise
+            # Download and parsing are interleaved; parse is everything that
+            # wasn't spent waiting on the network
+            span.record('scrape.transfer', transfer[0], bytes=data['html_bytes'])
+            span.record('scrape.parse', time.perf_counter() - start - transfer[0])
+            span.add('bytes', data['html_bytes'])
+            data['status_code'] = response.status_code
+            data['url'] = url
+            data['final_url'] = response.url
+            data['security_headers'] = {name: response.headers[name] for name in SECURITY_HEADERS if name in response.headers}
+            data['tls_version'] = negotiated_tls
+
+        add_page_metrics(data)
+
+        if body:
+            cache.put(
+                url, data,
+                body_hash=body.commit(),
+                body_size=body.size,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                data_version=EXTRACTOR_VERSION,
+                content_type=response.headers.get('Content-Type'),
+            )
+        return data
@@ -0,0 +1,473 @@
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib import robotparser
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from xml.etree.ElementTree import iterparse
+
+from scraper import DEFAULT_HEADERS, fetch_site_data, make_session
+
+# Multi-page crawl of one site.
+#
+# Starting from a URL (plus everything listed in its sitemap.xml) the crawler
+# follows internal links breadth-first up to a depth and page budget, with a
+# per-host request rate and robots.txt honoured. Pages are folded into a
+# SiteAggregator as they arrive and then dropped, so memory stays flat on
+# large sites; only compact 64-bit URL fingerprints are kept for de-dup.
+# The start page is fetched first: the scheme and host it ends up on after
+# redirects are canonical, so http/https and www/non-www spellings of a page
+# are fetched once.
+#
+#   python site_crawler.py https://example.com --max-pages 500 -o pages.jsonl
+
+# Links to these are not HTML pages and are never fetched
+SKIP_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg', '.ico', '.pdf', '.zip', '.gz',
+    '.mp3', '.mp4', '.mov', '.avi', '.webm', '.css', '.js', '.json', '.xml', '.txt', '.doc',
+    '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.woff', '.woff2', '.ttf', '.eot',
+)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# How many sitemap URLs are kept verbatim so orphan pages can be named
+ORPHAN_SAMPLE_POOL = 1000
+# How many distinct titles are kept verbatim (with a few URLs each) so
+# duplicated titles can be named; the rest are only counted
+TITLE_SAMPLE_POOL = 1000
+MAX_SITEMAPS = 50
+
+
+# Function to resolve a link against its page and put it in canonical form,
+# or return None for anything that isn't an http(s) page
+def normalize_url(url, base=None):
+    url = urljoin(base, url.strip()) if base else url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if parts.port and parts.port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{parts.port}"
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+# Function to fingerprint a normalized URL as a 64-bit integer
+def url_key(url):
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+# Hosts that count as "this site": example.com and www.example.com are the same
+def site_host(url):
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith('www.') else host
+
+# Function to group URLs into page templates, e.g. /products/123 -> /products/*
+def url_template(url):
+    segments = [s for s in urlsplit(url).path.split('/') if s]
+    if not segments:
+        return '/'
+    return '/' + segments[0] + ('/*' if len(segments) > 1 else '')
+
+
+# Set of URLs stored as 64-bit fingerprints instead of full strings
+class SeenSet:
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, url):
+        key = url_key(url)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def __contains__(self, url):
+        return url_key(url) in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+
+# Spaces out requests to each host by at least `interval` seconds
+class HostThrottle:
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, host, interval=None):
+        interval = max(self.interval, interval or 0)
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, 0))
+            self.next_slot[host] = slot + interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# Cached robots.txt rules per host
+class RobotsRules:
+    def __init__(self, session, user_agent=DEFAULT_HEADERS['User-Agent']):
+        self.session = session
+        self.user_agent = user_agent
+        self.lock = threading.Lock()
+        self.parsers = {}
+
+    def _parser(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self.lock:
+            parser = self.parsers.get(origin)
+        if parser is not None:
+            return parser
+        parser = robotparser.RobotFileParser(origin + '/robots.txt')
+        try:
+            response = self.session.get(origin + '/robots.txt', headers=DEFAULT_HEADERS, timeout=10)
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except Exception:
+            parser.allow_all = True
+        with self.lock:
+            self.parsers[origin] = parser
+        return parser
+
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        return self._parser(url).crawl_delay(self.user_agent)
+
+    def sitemaps(self, url):
+        return self._parser(url).site_maps() or []
+
+
+# Function to stream page URLs out of a sitemap (or sitemap index) without
+# loading the whole document
+def iter_sitemap_urls(session, sitemap_url, limit=MAX_SITEMAPS):
+    pending = deque([sitemap_url])
+    visited = 0
+    while pending and visited < limit:
+        url = pending.popleft()
+        visited += 1
+        try:
+            response = session.get(url, headers=DEFAULT_HEADERS, timeout=10, stream=True)
+            if response.status_code >= 400:
+                response.close()
+                continue
+            response.raw.decode_content = True
+            with response:
+                for _, element in iterparse(response.raw):
+                    if element.tag.endswith('}loc') or element.tag == 'loc':
+                        loc = (element.text or '').strip()
+                        if loc.endswith('.xml') or loc.endswith('.xml.gz'):
+                            pending.append(loc)
+                        elif loc:
+                            yield loc
+                    element.clear()
+        except Exception:
+            continue
+
+
+# Site-level metrics built up one page at a time
+class SiteAggregator:
+    def __init__(self):
+        self.pages = 0
+        self.errors = 0
+        self.blocked = 0
+        self.missing_title = 0
+        self.missing_meta = 0
+        self.missing_h1 = 0
+        self.words = 0
+        self.templates = {}
+        # title fingerprint -> pages using it
+        self.title_counts = {}
+        # title fingerprint -> {'title', 'urls'} for at most TITLE_SAMPLE_POOL
+        # titles, and the sampled ones seen on only one page so far
+        self.title_samples = {}
+        self.unique_samples = set()
+        self.linked = set()
+        self.sitemap_keys = set()
+        self.sitemap_sample = []
+
+    def add_sitemap_url(self, url):
+        self.sitemap_keys.add(url_key(url))
+        if len(self.sitemap_sample) < ORPHAN_SAMPLE_POOL:
+            self.sitemap_sample.append(url)
+
+    def add_link(self, url):
+        self.linked.add(url_key(url))
+
+    def add_error(self):
+        self.errors += 1
+
+    def add_blocked(self):
+        self.blocked += 1
+
+    # Function to keep the title and first few URLs of a title; once the pool
+    # is full a duplicated title takes the place of one seen only once
+    def _sample_title(self, key, title, url, count):
+        sample = self.title_samples.get(key)
+        if sample is not None:
+            if len(sample['urls']) < 5:
+                sample['urls'].append(url)
+            self.unique_samples.discard(key)
+            return
+        if len(self.title_samples) >= TITLE_SAMPLE_POOL:
+            if count < 2 or not self.unique_samples:
+                return
+            del self.title_samples[self.unique_samples.pop()]
+        self.title_samples[key] = {'title': title, 'urls': [url]}
+        if count == 1:
+            self.unique_samples.add(key)
+
+    def add_page(self, url, page):
+        self.pages += 1
+        self.words += page['word_count']
+        if page['title'] == 'No title':
+            self.missing_title += 1
+        else:
+            key = url_key(page['title'])
+            count = self.title_counts[key] = self.title_counts.get(key, 0) + 1
+            self._sample_title(key, page['title'], url, count)
+        if page['meta_description'] == 'No meta description':
+            self.missing_meta += 1
+        if not page['h1_count']:
+            self.missing_h1 += 1
+
+        template = self.templates.setdefault(url_template(url), {'pages': 0, 'images': 0, 'images_with_alt': 0})
+        template['pages'] += 1
+        template['images'] += page['image_count']
+        template['images_with_alt'] += sum(1 for img in page['images'] if img['alt'])
+
+    # `complete` is whether every reachable page was crawled; otherwise pages
+    # linked only from uncrawled pages would look orphaned, so sitemap URLs
+    # without a link are reported as such rather than as orphans
+    def summary(self, complete=True):
+        unlinked = self.sitemap_keys - self.linked
+        duplicates = sorted(
+            (
+                {'title': sample['title'], 'count': self.title_counts[key], 'urls': sample['urls']}
+                for key, sample in self.title_samples.items() if self.title_counts[key] > 1
+            ),
+            key=lambda d: d['count'], reverse=True,
+        )
+        return {
+            'pages_crawled': self.pages,
+            'errors': self.errors,
+            'blocked_by_robots': self.blocked,
+            'missing_title': self.missing_title,
+            'missing_meta_description': self.missing_meta,
+            'missing_h1': self.missing_h1,
+            'average_word_count': round(self.words / self.pages) if self.pages else 0,
+            'duplicate_title_groups': sum(1 for count in self.title_counts.values() if count > 1),
+            'duplicate_titles': duplicates[:50],
+            'sitemap_urls': len(self.sitemap_keys),
+            'crawl_complete': complete,
+            'orphan_pages': len(unlinked) if complete else None,
+            'unlinked_sitemap_urls': len(unlinked),
+            'unlinked_samples': [u for u in self.sitemap_sample if url_key(u) in unlinked][:20],
+            'alt_text_coverage_by_template': {
+                name: {
+                    'pages': t['pages'],
+                    'images': t['images'],
+                    'coverage': t['images_with_alt'] / t['images'] if t['images'] else None,
+                }
+                for name, t in sorted(self.templates.items(), key=lambda item: -item[1]['pages'])
+            },
+        }
+
+
+class SiteCrawler:
+    def __init__(self, start_url, max_pages=500, max_depth=3, concurrency=8,
+                 requests_per_second=2.0, use_sitemap=True, respect_robots=True, cache=None):
+        self.start_url = normalize_url(start_url)
+        if not self.start_url:
+            raise ValueError(f"Not an http(s) URL: {start_url}")
+        self.host = site_host(self.start_url)
+        # Canonical origin, replaced by the start page's final one in crawl()
+        self.scheme, self.netloc = urlsplit(self.start_url)[:2]
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.use_sitemap = use_sitemap
+        self.cache = cache
+        self.session = make_session(concurrency)
+        self.throttle = HostThrottle(1.0 / requests_per_second if requests_per_second else 0)
+        self.robots = RobotsRules(self.session) if respect_robots else None
+        self.seen = SeenSet()
+        # URLs queued so far, for the page budget; seen also holds the
+        # other spellings of the start URL
+        self.queued = 0
+        self.frontier = deque()
+        # Set once a new URL is dropped for the page or depth budget
+        self.truncated = False
+        self.aggregator = SiteAggregator()
+
+    def is_internal(self, url):
+        return site_host(url) == self.host and not urlsplit(url).path.lower().endswith(SKIP_EXTENSIONS)
+
+    # Function to map a normalized URL to this site's spelling of it (the
+    # canonical scheme and host, with or without www.), or None if it's
+    # external, so every spelling of a page is fetched and counted once
+    def internal_url(self, url):
+        if not url or not self.is_internal(url):
+            return None
+        parts = urlsplit(url)
+        if (parts.scheme, parts.netloc) == (self.scheme, self.netloc):
+            return url
+        return urlunsplit(parts._replace(scheme=self.scheme, netloc=self.netloc))
+
+    # Function to make the origin the start page was finally served from
+    # canonical, if it's still this site
+    def _adopt_origin(self, final_url):
+        final = normalize_url(final_url)
+        if not final or site_host(final) != self.host:
+            return
+        self.scheme, self.netloc = urlsplit(final)[:2]
+        self.seen.add(final)
+        self.aggregator.add_link(final)
+
+    def _enqueue(self, url, depth):
+        if url in self.seen:
+            return
+        if depth > self.max_depth or self.queued >= self.max_pages:
+            self.truncated = True
+            return
+        self.seen.add(url)
+        self.queued += 1
+        self.frontier.append((url, depth))
+
+    def _seed_from_sitemaps(self):
+        origin = f"{self.scheme}://{self.netloc}"
+        sitemaps = self.robots.sitemaps(origin + '/') if self.robots else []
+        if not sitemaps:
+            sitemaps = [origin + '/sitemap.xml']
+        for sitemap in sitemaps:
+            for loc in iter_sitemap_urls(self.session, sitemap):
+                url = self.internal_url(normalize_url(loc))
+                if url:
+                    self.aggregator.add_sitemap_url(url)
+                    self._enqueue(url, 1)
+
+    def _fetch(self, url):
+        delay = self.robots.crawl_delay(url) if self.robots else None
+        self.throttle.wait(urlsplit(url).netloc, delay)
+        return fetch_site_data(url, self.session, self.cache)
+
+    def _allowed(self, url):
+        if self.robots and not self.robots.allowed(url):
+            self.aggregator.add_blocked()
+            return False
+        return True
+
+    # Function to fold a fetched page into the aggregate and queue its links,
+    # which are relative to where the page ended up after redirects; returns
+    # the compact record crawl() yields
+    def _visit(self, url, depth, result):
+        try:
+            page = result()
+        except Exception as e:
+            self.aggregator.add_error()
+            return {'url': url, 'depth': depth, 'error': str(e)}
+        if depth == 0:
+            self._adopt_origin(page.get('final_url') or url)
+
+        base = page.get('final_url') or url
+        for href in page['links']:
+            link = self.internal_url(normalize_url(href, base))
+            if link:
+                self.aggregator.add_link(link)
+                self._enqueue(link, depth + 1)
+        self.aggregator.add_page(url, page)
+        return {
+            'url': url,
+            'depth': depth,
+            'title': page['title'],
+            'meta_description': page['meta_description'],
+            'word_count': page['word_count'],
+            'h1_count': page['h1_count'],
+            'image_count': page['image_count'],
+            'link_count': page['link_count'],
+            'alt_text_coverage': page['alt_text_coverage'],
+        }
+
+    # Yields one compact record per crawled page; the full page dicts are
+    # discarded once their links and metrics have been recorded
+    def crawl(self):
+        # The start page goes first and alone, as its final URL decides the
+        # canonical origin for its links and the sitemap's
+        self._enqueue(self.start_url, 0)
+        url, depth = self.frontier.popleft()
+        if self._allowed(url):
+            yield self._visit(url, depth, lambda: self._fetch(url))
+        # The start page is reached by definition, so it's never an orphan
+        start = self.internal_url(self.start_url)
+        self.seen.add(start)
+        self.aggregator.add_link(start)
+        if self.use_sitemap:
+            self._seed_from_sitemaps()
+
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl') as pool:
+            while self.frontier or in_flight:
+                while self.frontier and len(in_flight) < self.concurrency:
+                    url, depth = self.frontier.popleft()
+                    if self._allowed(url):
+                        in_flight[pool.submit(self._fetch, url)] = (url, depth)
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = in_flight.pop(future)
+                    yield self._visit(url, depth, future.result)
+        self.session.close()
+
+    def summary(self):
+        return self.aggregator.summary(complete=not self.truncated)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crawl a site and report site-level SEO metrics.")
+    parser.add_argument('url', help="start URL")
+    parser.add_argument('-o', '--output', help="write one JSON line per crawled page to this file")
+    parser.add_argument('--max-pages', type=int, default=500)
+    parser.add_argument('--max-depth', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=2.0, help="max requests per second per host")
+    parser.add_argument('--no-sitemap', action='store_true', help="don't seed the crawl from sitemap.xml")
+    parser.add_argument('--ignore-robots', action='store_true')
+    args = parser.parse_args(argv)
+
+    crawler = SiteCrawler(
+        args.url,
+        max_pages=args.max_pages,
+        max_depth=args.max_depth,
+        concurrency=args.concurrency,
+        requests_per_second=args.rate,
+        use_sitemap=not args.no_sitemap,
+        respect_robots=not args.ignore_robots,
+    )
+    out = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        for count, record in enumerate(crawler.crawl(), 1):
+            if out:
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            print(f"[{count}] {'error' if 'error' in record else 'ok':5} {record['url']}", file=sys.stderr)
+    finally:
+        if out:
+            out.close()
+    print(json.dumps(crawler.summary(), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
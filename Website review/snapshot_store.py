@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+from llm_cache import page_fingerprint
+from llm_pipeline import page_units
+
+# Audit history: one snapshot per audit (site_data, sub-resource report,
+# scores, analysis and the fingerprint of every section of the page), plus
+# the map-step findings of each analysis.
+#
+# Re-auditing a page diffs its sections against the last snapshot, and the
+# analysis reuses the findings of every chunk whose sections are unchanged,
+# so only the parts of the page that changed go back to the model. Scores are
+# stored in their own columns, so trends come straight from the database.
+#
+# Unlike the caches this is kept indefinitely, in CRO_HISTORY_DB.
+
+DEFAULT_HISTORY_DB = os.getenv(
+    'CRO_HISTORY_DB', os.path.join(os.path.expanduser('~'), '.local', 'share', 'cro_reviewer', 'history.sqlite3')
+)
+# Analyses kept per URL for reuse; only the latest one is ever reused
+ANALYSES_PER_URL = 3
+SCORE_FIELDS = ('performance', 'seo', 'ux', 'content', 'security')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    page_fingerprint TEXT NOT NULL,
+    performance INTEGER,
+    seo INTEGER,
+    ux INTEGER,
+    content INTEGER,
+    security INTEGER,
+    site_data BLOB NOT NULL,
+    assets BLOB,
+    analysis BLOB
+);
+CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (url, created_at);
+CREATE TABLE IF NOT EXISTS sections (
+    snapshot_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    heading TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, position)
+);
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version INTEGER NOT NULL,
+    page_fingerprint TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    text BLOB NOT NULL,
+    chunks BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_url ON analyses (url, model, prompt_version, created_at);
+"""
+
+
+def pack(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob)) if blob is not None else None
+
+# Function to compare two section lists ({kind, heading, fingerprint}).
+# Sections are matched by kind and heading (the nth "Features" heading with
+# the nth one), so moving a section around doesn't count as a change.
+def diff_sections(old, new):
+    def keyed(sections):
+        seen = {}
+        result = {}
+        for section in sections:
+            name = (section['kind'], section['heading'])
+            seen[name] = seen.get(name, 0) + 1
+            result[name + (seen[name],)] = section['fingerprint']
+        return result
+
+    old, new = keyed(old), keyed(new)
+    return {
+        'changed': [key[1] for key in new if key in old and old[key] != new[key]],
+        'added': [key[1] for key in new if key not in old],
+        'removed': [key[1] for key in old if key not in new],
+        'unchanged': sum(1 for key in new if old.get(key) == new[key]),
+    }
+
+
+class SnapshotStore:
+    def __init__(self, path=DEFAULT_HISTORY_DB):
+        self.path = path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    # One connection per thread; SQLite handles locking between processes
+    def _db(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    # Stores the text and map-step chunks (MapReduceAnalyzer.chunk_records)
+    # of an analysis so the next audit of the page can reuse them
+    def save_analysis(self, url, model, prompt_version, fingerprint, text, chunks):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'INSERT INTO analyses (url, model, prompt_version, page_fingerprint, created_at, text, chunks) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, model, prompt_version, fingerprint, time.time(), zlib.compress(text.encode('utf-8')), pack(chunks)),
+            )
+            db.execute(
+                'DELETE FROM analyses WHERE url = ? AND id NOT IN '
+                '(SELECT id FROM analyses WHERE url = ? ORDER BY created_at DESC LIMIT ?)',
+                (url, url, ANALYSES_PER_URL),
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    # Most recent analysis of url by this model and prompt version, or None
+    def latest_analysis(self, url, model, prompt_version):
+        row = self._db().execute(
+            'SELECT page_fingerprint, created_at, text, chunks FROM analyses '
+            'WHERE url = ? AND model = ? AND prompt_version = ? ORDER BY created_at DESC LIMIT 1',
+            (url, model, prompt_version),
+        ).fetchone()
+        if row is None:
+            return None
+        fingerprint, created_at, text, chunks = row
+        return {
+            'page_fingerprint': fingerprint,
+            'created_at': created_at,
+            'text': zlib.decompress(text).decode('utf-8'),
+            'chunks': unpack(chunks),
+        }
+
+    # Records one audit; returns its id and the section diff against the
+    # previous snapshot of the same URL (None for the first one)
+    def save_snapshot(self, site_data, scores, analysis=None, assets=None):
+        url = site_data['url']
+        sections = [
+            {'kind': unit['kind'], 'heading': unit['heading'], 'fingerprint': unit['fingerprint']}
+            for unit in page_units(site_data)
+        ]
+        previous = self.latest_snapshot(url)
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = db.execute(
+                'INSERT INTO snapshots (url, created_at, page_fingerprint, performance, seo, ux, content, security, '
+                'site_data, assets, analysis) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    url, time.time(), page_fingerprint(site_data), *(scores.get(name) for name in SCORE_FIELDS),
+                    pack(site_data), pack(assets) if assets is not None else None,
+                    zlib.compress(analysis.encode('utf-8')) if analysis is not None else None,
+                ),
+            )
+            snapshot_id = cursor.lastrowid
+            db.executemany(
+                'INSERT INTO sections (snapshot_id, position, kind, heading, fingerprint) VALUES (?, ?, ?, ?, ?)',
+                [(snapshot_id, i, s['kind'], s['heading'], s['fingerprint']) for i, s in enumerate(sections)],
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        diff = None
+        if previous:
+            diff = dict(diff_sections(self.sections(previous['id']), sections), previous_at=previous['created_at'])
+        return {'id': snapshot_id, 'diff': diff}
+
+    def sections(self, snapshot_id):
+        rows = self._db().execute(
+            'SELECT kind, heading, fingerprint FROM sections WHERE snapshot_id = ? ORDER BY position', (snapshot_id,)
+        ).fetchall()
+        return [{'kind': kind, 'heading': heading, 'fingerprint': fingerprint} for kind, heading, fingerprint in rows]
+
+    # Scores and metadata of the latest snapshot of url; with full=True also
+    # the stored site_data, assets and analysis
+    def latest_snapshot(self, url, full=False):
+        row = self._db().execute(
+            'SELECT id FROM snapshots WHERE url = ? ORDER BY created_at DESC LIMIT 1', (url,)
+        ).fetchone()
+        return self.snapshot(row[0], full) if row else None
+
+    def snapshot(self, snapshot_id, full=False):
+        columns = 'id, url, created_at, page_fingerprint, ' + ', '.join(SCORE_FIELDS)
+        if full:
+            columns += ', site_data, assets, analysis'
+        row = self._db().execute(f'SELECT {columns} FROM snapshots WHERE id = ?', (snapshot_id,)).fetchone()
+        if row is None:
+            return None
+        result = {
+            'id': row[0], 'url': row[1], 'created_at': row[2], 'page_fingerprint': row[3],
+            'scores': dict(zip(SCORE_FIELDS, row[4:9])),
+        }
+        if full:
+            result['site_data'] = unpack(row[9])
+            result['assets'] = unpack(row[10])
+            result['analysis'] = zlib.decompress(row[11]).decode('utf-8') if row[11] is not None else None
+        return result
+
+    # Scores of every audit of url since `since` (a Unix time), oldest first
+    def score_history(self, url, since=0, limit=None):
+        rows = self._db().execute(
+            f'SELECT id, created_at, {", ".join(SCORE_FIELDS)} FROM snapshots '
+            'WHERE url = ? AND created_at >= ? ORDER BY created_at DESC LIMIT ?',
+            (url, since, limit or -1),
+        ).fetchall()
+        return [
+            {'id': row[0], 'created_at': row[1], **dict(zip(SCORE_FIELDS, row[2:]))}
+            for row in reversed(rows)
+        ]
+
+    # Every audited URL with its audit count, last audit time and last scores
+    def sites(self):
+        rows = self._db().execute(
+            f'SELECT s.url, counts.audits, s.created_at, {", ".join("s." + f for f in SCORE_FIELDS)} '
+            'FROM snapshots s JOIN (SELECT url, COUNT(*) AS audits, MAX(created_at) AS last FROM snapshots GROUP BY url) counts '
+            'ON s.url = counts.url AND s.created_at = counts.last ORDER BY s.url'
+        ).fetchall()
+        return [
+            {'url': row[0], 'audits': row[1], 'last_audit': row[2], **dict(zip(SCORE_FIELDS, row[3:]))}
+            for row in rows
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the audit history.")
+    parser.add_argument('--db', default=DEFAULT_HISTORY_DB, help="history database")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('sites', help="every audited URL with its latest scores")
+    trend = sub.add_parser('trend', help="score history of one URL")
+    trend.add_argument('url')
+    trend.add_argument('--days', type=float, help="only the last N days")
+    trend.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.db)
+    if args.command == 'sites':
+        rows = store.sites()
+        key = 'last_audit'
+    else:
+        rows = store.score_history(args.url, since=time.time() - args.days * 86400 if args.days else 0)
+        key = 'created_at'
+        if args.json:
+            print(json.dumps(rows, indent=2))
+            return 0
+    if not rows:
+        print("No audits recorded", file=sys.stderr)
+        return 1
+    label = 'url' if args.command == 'sites' else 'id'
+    print(f"{label:<40} {'audited':<17} " + ' '.join(f"{name:>11}" for name in SCORE_FIELDS))
+    for row in rows:
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(row[key]))
+        print(f"{str(row[label]):<40} {when:<17} " + ' '.join(f"{row[name] if row[name] is not None else '-':>11}" for name in SCORE_FIELDS))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
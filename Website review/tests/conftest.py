@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The tests run fully offline: pages come from benchmarks/server.PageServer
+# and the model is fake_llm.FakeModel. Caches, audit history and the job
+# database go to a temporary directory; the settings are read at import
+# time, so they're set before any app module is imported.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks'), os.path.join(ROOT, 'backend')]
+
+_state_dir = tempfile.mkdtemp(prefix='cro-tests-')
+os.environ.update(
+    CRO_FAKE_LLM='1',
+    CRO_FAKE_LLM_LATENCY='0',
+    CRO_CACHE_DIR=os.path.join(_state_dir, 'cache'),
+    CRO_HISTORY_DB=os.path.join(_state_dir, 'history.sqlite3'),
+    CRO_JOBS_DB=os.path.join(_state_dir, 'jobs.sqlite3'),
+    GEMINI_RPM='1000000',
+    GEMINI_TPM='1000000000',
+)
+
+from server import PageServer
+
+
+def html_page(title, body):
+    return (
+        f'<html><head><title>{title}</title><meta name="description" content="About {title}"></head>'
+        f'<body>{body}</body></html>'
+    ).encode('utf-8')
+
+
+# Function to start a PageServer for one test: page_server(pages, **options)
+@pytest.fixture
+def page_server():
+    servers = []
+
+    def start(pages, **options):
+        server = PageServer(pages, **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
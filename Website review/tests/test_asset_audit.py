@@ -0,0 +1,69 @@
+import requests
+
+from asset_audit import probe_asset, summarize, performance_score, security_score
+from server import asset_size
+
+
+def probe(server, path, kind):
+    with requests.Session() as session:
+        return probe_asset(session, {'url': server.url + path, 'type': kind})
+
+
+def test_probe_reads_head_headers(page_server):
+    server = page_server({})
+    result = probe(server, 'app.js', 'script')
+    assert result['status'] == 200
+    assert result['bytes'] == asset_size('/app.js')
+    assert result['content_encoding'] == 'gzip'
+    assert result['cache_control'] == 'public, max-age=86400'
+
+
+def test_probe_keeps_head_headers_when_size_comes_from_ranged_get(page_server):
+    # HEAD has no length, and the 206 to the ranged GET has no Content-Encoding
+    server = page_server({}, head_lengths=False)
+    result = probe(server, 'site.css', 'stylesheet')
+    assert result['status'] == 200
+    assert result['bytes'] == asset_size('/site.css')
+    assert result['content_encoding'] == 'gzip'
+    assert result['content_type'] == 'text/css'
+
+
+def test_probe_missing_asset(page_server):
+    server = page_server({})
+    result = probe(server, 'missing.html', 'image')
+    assert result['status'] == 404
+    assert result['error'] is None
+
+
+def test_probe_unreachable_host():
+    with requests.Session() as session:
+        result = probe_asset(session, {'url': 'http://127.0.0.1:9/x.png', 'type': 'image'}, timeout=1)
+    assert result['status'] is None
+    assert result['error']
+
+
+def test_summary_and_scores(page_server):
+    server = page_server({}, head_lengths=False)
+    probes = [
+        probe(server, 'site.css', 'stylesheet'),
+        probe(server, 'app.js', 'script'),
+        probe(server, 'hero.webp', 'image'),
+        probe(server, 'logo.png', 'image'),
+        probe(server, 'gone.html', 'image'),
+    ]
+    site_data = {
+        'url': server.url, 'html_bytes': 1000,
+        'security_headers': {'X-Content-Type-Options': 'nosniff', 'Referrer-Policy': 'no-referrer'},
+    }
+    report = summarize(site_data, probes)
+    assert report['request_count'] == 6
+    assert report['failed_requests'] == 1
+    assert report['compression_coverage'] == 1.0
+    assert report['cache_coverage'] == 1.0
+    assert report['image_formats'] == {'webp': 1, 'png': 1}
+    assert report['modern_image_share'] == 0.5
+    assert report['total_bytes'] == 1000 + sum(asset_size(f'/{p}') for p in ('site.css', 'app.js', 'hero.webp', 'logo.png'))
+    # Under 1 MB and few requests: only the half-legacy images cost points
+    assert performance_score(report) == 95
+    # Plain http with two of the headers
+    assert security_score(report) == 20
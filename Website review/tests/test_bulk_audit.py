@@ -0,0 +1,70 @@
+import threading
+
+import bulk_audit
+from bulk_audit import BulkAuditor, load_completed, read_urls
+from conftest import html_page
+
+
+class ListWriter:
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+# Function to run an audit on a thread, so a hang fails the test instead of
+# blocking it
+def run(auditor, urls, timeout=30):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(auditor.run(urls)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "BulkAuditor.run() did not return"
+    return result[0]
+
+
+def test_read_urls_drops_blanks_comments_and_duplicates(tmp_path):
+    path = tmp_path / 'urls.txt'
+    path.write_text('http://a.test/\n\n# comment\nhttp://b.test/\nhttp://a.test/\n', encoding='utf-8')
+    assert read_urls(str(path)) == ['http://a.test/', 'http://b.test/']
+
+    path = tmp_path / 'urls.csv'
+    path.write_text('name,url\nA,http://a.test/\nB,http://b.test/\n', encoding='utf-8')
+    assert read_urls(str(path)) == ['http://a.test/', 'http://b.test/']
+
+def test_load_completed_skips_partial_lines(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    path.write_text(
+        '{"url": "http://a.test/", "status": "ok"}\n{"url": "http://b.test/", "status": "error"}\n{"url": "http://c',
+        encoding='utf-8',
+    )
+    assert load_completed(str(path)) == {'http://a.test/'}
+
+
+def test_run_audits_every_url(page_server):
+    server = page_server({'a.html': html_page('A', '<h1>A</h1><p>First page</p>'),
+                          'b.html': html_page('B', '<h1>B</h1><p>Second page</p>')})
+    writer = ListWriter()
+    auditor = BulkAuditor(writer, fetch_concurrency=4, llm_concurrency=2, audit_assets=False, history=False)
+    urls = [server.url + 'a.html', server.url + 'b.html', 'http://127.0.0.1:9/']
+    assert run(auditor, urls) == (3, 1)
+
+    records = {record['url']: record for record in writer.records}
+    assert records[server.url + 'a.html']['status'] == 'ok'
+    assert records[server.url + 'a.html']['analysis'].startswith('## Fake analysis')
+    assert 'content' not in records[server.url + 'b.html']['site_data']
+    assert records['http://127.0.0.1:9/']['stage'] == 'scrape'
+
+def test_errors_after_the_scrape_still_finish_the_site(page_server, monkeypatch):
+    server = page_server({'a.html': html_page('A', '<p>First page</p>')})
+
+    def broken(site_data, assets=None):
+        raise ValueError('no scores')
+
+    monkeypatch.setattr(bulk_audit, 'calculate_scores', broken)
+    writer = ListWriter()
+    auditor = BulkAuditor(writer, fetch_concurrency=2, skip_analysis=True, audit_assets=False, history=False)
+    assert run(auditor, [server.url + 'a.html']) == (1, 1)
+    assert writer.records[0]['stage'] == 'scores'
+    assert writer.records[0]['error'] == 'no scores'
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+import jobs
+from conftest import html_page
+from jobs import JobRunner, JobStore, QueueFull, run_audit
+from scraper import make_session
+
+
+PAGE = html_page(
+    'Garden Tools',
+    '<h1>Garden Tools</h1><p>Spades, rakes and hoes for every garden.</p>'
+    '<h2>Delivery</h2><p>Free delivery on orders over 50 euros.</p>'
+    '<a href="/about.html">About us</a><img src="/hero.webp" alt="A spade">',
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'), max_queued=3)
+
+# Function to make a running job look abandoned by its worker
+def go_stale(store, job_id):
+    store._db().execute(
+        'UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (time.time() - jobs.STALE_SECONDS - 1, job_id),
+    )
+
+
+def test_claim_takes_jobs_in_order(store):
+    batch_id, submitted = store.submit(['http://a.test/', 'http://b.test/'])
+    first = store.claim('w1')
+    second = store.claim('w2')
+    assert [first['url'], second['url']] == ['http://a.test/', 'http://b.test/']
+    assert store.claim('w1') is None
+
+    job = store.get(first['id'])
+    assert job['status'] == 'running' and job['attempts'] == 1
+    assert [j['id'] for j in store.batch(batch_id)] == [j['id'] for j in submitted]
+
+def test_submit_is_refused_past_the_queue_limit(store):
+    store.submit(['http://a.test/', 'http://b.test/'])
+    with pytest.raises(QueueFull) as e:
+        store.submit(['http://c.test/', 'http://d.test/'])
+    assert (e.value.queued, e.value.limit) == (2, 3)
+    # All or none: neither URL of the refused batch was queued
+    assert store.counts() == {'queued': 2}
+
+def test_sweep_requeues_jobs_without_a_heartbeat(store):
+    store.submit(['http://a.test/', 'http://b.test/'])
+    a = store.claim('w1')
+    b = store.claim('w1')
+    go_stale(store, a['id'])
+    go_stale(store, b['id'])
+    store.heartbeat([b['id']])
+    store.sweep()
+
+    assert store.get(a['id'])['status'] == 'queued'
+    assert store.get(b['id'])['status'] == 'running'
+    again = store.claim('w2')
+    assert again['id'] == a['id']
+    assert store.get(a['id'])['attempts'] == 2
+
+def test_sweep_fails_jobs_after_max_attempts(store):
+    _, (job,) = store.submit(['http://a.test/'])
+    for _ in range(jobs.MAX_ATTEMPTS):
+        assert store.claim('w1')['id'] == job['id']
+        go_stale(store, job['id'])
+        store.sweep()
+    status = store.get(job['id'])
+    assert status['status'] == 'failed'
+    assert status['error'] == 'Worker stopped while running this audit'
+
+def test_sweep_deletes_expired_jobs(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'), ttl=0)
+    _, (job,) = store.submit(['http://a.test/'])
+    store.claim('w1')
+    store.fail(job['id'], 'broken')
+    time.sleep(0.01)
+    store.sweep()
+    assert store.get(job['id']) is None
+
+
+def test_run_audit(page_server):
+    server = page_server({'index.html': PAGE, 'about.html': html_page('About', '<p>About us</p>')})
+    stages = []
+    with make_session() as session:
+        result, html = run_audit(server.url + 'index.html', session, stages.append)
+
+    assert set(stages) == {'site_data', 'assets', 'scores', 'analysis', 'summary', 'html_report', 'history'}
+    assert result['site_data']['title'] == 'Garden Tools'
+    assert 'content' not in result['site_data']
+    assert set(result['scores']) >= {'performance', 'seo', 'security'}
+    assert result['analysis'].startswith('## Fake analysis')
+    assert 'Garden Tools' in html
+
+def test_run_audit_raises_when_the_page_is_unreachable():
+    with make_session() as session:
+        with pytest.raises(RuntimeError, match='^site_data'):
+            run_audit('http://127.0.0.1:9/', session)
+
+
+def test_runner_finishes_jobs(page_server, store):
+    server = page_server({'index.html': PAGE})
+    runner = JobRunner(store, workers=2)
+    runner.start()
+    try:
+        _, submitted = store.submit([server.url + 'index.html', 'http://127.0.0.1:9/'])
+        runner.notify()
+        deadline = time.time() + 30
+        while time.time() < deadline and store.counts().get('queued', 0) + store.counts().get('running', 0):
+            time.sleep(0.1)
+    finally:
+        runner.stop(5)
+
+    done, failed = (store.get(job['id']) for job in submitted)
+    assert done['status'] == 'done'
+    assert store.result(done['id'])['site_data']['title'] == 'Garden Tools'
+    assert 'Garden Tools' in store.html(done['id'])
+    assert failed['status'] == 'failed'
+    assert failed['error']
+    assert runner.active == 0
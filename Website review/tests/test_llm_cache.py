@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+import cro_streamlit as app
+from conftest import html_page
+from llm_cache import AnalysisCache, SingleFlight, analysis_key
+from scraper import fetch_site_data
+
+
+def wait_for_followers(flight, key, count):
+    # Followers block on the leader's future; give them a moment to get there
+    future = flight.calls[key]
+    for _ in range(200):
+        if len(future._waiters) >= count:
+            return
+        threading.Event().wait(0.01)
+
+
+def test_analysis_cache_round_trip(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    assert cache.get('k') is None
+    cache.put('k', 'model', 'text')
+    assert cache.get('k') == 'text'
+
+def test_key_follows_the_page():
+    page = {'url': 'http://example.test/', 'title': 'A', 'content': 'x'}
+    assert analysis_key('m', 1, page) == analysis_key('m', 1, dict(page, status_code=200))
+    assert analysis_key('m', 1, page) != analysis_key('m', 1, dict(page, title='B'))
+    assert analysis_key('m', 1, page) != analysis_key('m', 2, page)
+
+
+def test_single_flight_runs_identical_calls_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return 'result'
+
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', work)))
+    leader.start()
+    while 'k' not in flight.calls:
+        threading.Event().wait(0.001)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('k', work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    wait_for_followers(flight, 'k', 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ['result'] * 4
+    assert flight.calls == {}
+
+def test_single_flight_failure_reaches_followers():
+    flight = SingleFlight()
+    future, leader = flight.begin('k')
+    assert leader
+    follower, is_leader = flight.begin('k')
+    assert follower is future and not is_leader
+
+    flight.fail('k', ValueError('boom'))
+    with pytest.raises(ValueError):
+        follower.result()
+    # The next call starts over instead of reusing the failure
+    assert flight.do('k', lambda: 'again') == 'again'
+
+def test_single_flight_do_raises_to_the_leader():
+    flight = SingleFlight()
+
+    def broken():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('k', broken)
+    assert flight.calls == {}
+
+
+class BrokenCache:
+    def get(self, key):
+        return None
+
+    def put(self, key, model_name, text):
+        raise OSError('disk full')
+
+
+def test_stream_analysis_releases_followers_when_caching_fails(page_server, monkeypatch):
+    server = page_server({'index.html': html_page('Shop', '<h1>Shop</h1><p>Buy things here.</p>')})
+    site_data = fetch_site_data(server.url + 'index.html')
+    monkeypatch.setattr(app, 'get_analysis_cache', lambda: BrokenCache())
+    inflight = app.get_inflight_analyses()
+    key = analysis_key(app.MODEL_NAME, app.PROMPT_VERSION, site_data)
+
+    stream = app.stream_analysis(site_data)
+    first = next(stream)
+    assert key in inflight.calls
+    joined = []
+    follower = threading.Thread(target=lambda: joined.append(''.join(app.stream_analysis(site_data))), daemon=True)
+    follower.start()
+    wait_for_followers(inflight, key, 1)
+
+    text = first + ''.join(stream)
+    follower.join(5)
+    assert joined == [text]
+    assert key not in inflight.calls
@@ -0,0 +1,137 @@
+import threading
+import time
+
+from fake_llm import FakeModel
+from llm_pipeline import MapReduceAnalyzer, RateLimiter, build_chunks, reuse_chunks, unit_fingerprint
+
+
+def unit(heading, text):
+    return {'kind': 'section', 'heading': heading, 'text': text,
+            'fingerprint': unit_fingerprint('section', heading, text)}
+
+def analyzed(chunks):
+    for i, chunk in enumerate(chunks):
+        chunk['findings'] = f"findings {i}"
+    return chunks
+
+def page(sections):
+    return {
+        'url': 'http://example.test/', 'title': 'Example',
+        'sections': [{'heading': h, 'level': 'h2', 'text': t} for h, t in sections],
+        'images': [], 'links': [],
+    }
+
+
+# Model that records how many calls overlap
+class CountingModel(FakeModel):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.in_flight = 0
+        self.peak = 0
+
+    def generate_content(self, prompt, stream=False):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            return super().generate_content(prompt, stream=stream)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_rate_limiter_caps_calls_in_flight():
+    limiter = RateLimiter(1000000, 1000000000, max_concurrent=2)
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'peak': 0}
+
+    def call():
+        limiter.start_call()
+        try:
+            with lock:
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            time.sleep(0.02)
+            with lock:
+                state['in_flight'] -= 1
+        finally:
+            limiter.end_call()
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert state['peak'] == 2
+
+def test_map_calls_share_the_limiter_cap():
+    model = CountingModel(latency=0.02)
+    analyzer = MapReduceAnalyzer(model, RateLimiter(1000000, 1000000000, max_concurrent=2), max_workers=8, chunk_tokens=60)
+    site_data = page([(f"Section {i}", f"text {i} " * 40) for i in range(8)])
+    chunks = analyzer.chunks(site_data)
+    assert len(chunks) >= 4
+
+    analyzer.map(site_data, chunks)
+    assert model.calls == len(chunks)
+    assert model.peak == 2
+
+def test_map_retries_rate_limit_errors():
+    analyzer = MapReduceAnalyzer(FakeModel(fail_first=1), chunk_tokens=60)
+    site_data = page([("Intro", "text " * 40)])
+    chunks = analyzer.chunks(site_data)
+    partials = analyzer.map(site_data, chunks)
+    assert all(p.startswith('## Fake analysis') for p in partials)
+    assert analyzer.stats['calls'] == len(chunks)
+
+def test_closing_a_stream_releases_its_slot():
+    limiter = RateLimiter(1000000, 1000000000, max_concurrent=1)
+    analyzer = MapReduceAnalyzer(FakeModel(), limiter)
+    stream = analyzer.reduce("prompt", stream=True)
+    next(stream)
+    stream.close()
+    assert analyzer.reduce("prompt")
+
+
+def test_reuse_keeps_unchanged_chunks_in_page_order():
+    old = [unit('Intro', 'a' * 200), unit('Pricing', 'b' * 200), unit('FAQ', 'c' * 200)]
+    previous = analyzed(build_chunks(old, chunk_tokens=60))
+    assert len(previous) == 3
+
+    new = [old[0], unit('Pricing', 'changed ' * 25), old[2]]
+    chunks = reuse_chunks(new, previous, chunk_tokens=60)
+    assert [c['fingerprints'] for c in chunks] == [[u['fingerprint']] for u in new]
+    assert chunks[0]['findings'] == 'findings 0' and chunks[0]['reused']
+    assert 'findings' not in chunks[1]
+    assert chunks[2]['findings'] == 'findings 2' and chunks[2]['reused']
+
+def test_reuse_drops_chunks_with_a_removed_unit():
+    old = [unit('Intro', 'a' * 100), unit('Pricing', 'b' * 100)]
+    previous = analyzed(build_chunks(old, chunk_tokens=200))
+    assert len(previous) == 1
+
+    chunks = reuse_chunks([old[0]], previous, chunk_tokens=200)
+    assert len(chunks) == 1
+    assert 'findings' not in chunks[0]
+    assert chunks[0]['fingerprints'] == [old[0]['fingerprint']]
+
+def test_reuse_keeps_every_piece_of_a_split_unit():
+    long_unit = unit('Article', 'x' * 1000)
+    previous = analyzed(build_chunks([long_unit], chunk_tokens=100))
+    assert len(previous) > 1
+
+    chunks = reuse_chunks([long_unit], previous, chunk_tokens=100)
+    assert [c['findings'] for c in chunks] == [c['findings'] for c in previous]
+
+def test_reused_chunks_are_not_sent_to_the_model():
+    model = FakeModel()
+    site_data = page([("Intro", "intro " * 40), ("Pricing", "price " * 40)])
+    first = MapReduceAnalyzer(model, chunk_tokens=60)
+    first.map(site_data, first.chunks(site_data))
+    calls = model.calls
+
+    site_data['sections'][1]['text'] = "new price " * 40
+    second = MapReduceAnalyzer(model, chunk_tokens=60)
+    chunks = second.chunks(site_data, first.chunk_records())
+    second.map(site_data, chunks)
+    assert second.stats['reused_chunks'] >= 1
+    assert model.calls - calls == len(chunks) - second.stats['reused_chunks']
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from pdf_renderer import PdfBatcher, PdfCache, PdfRenderer, resolve_backend
+
+
+# Stands in for PdfRenderer in the batcher tests: "renders" each report to its bytes
+class EchoRenderer:
+    def __init__(self):
+        self.batches = []
+
+    def render_many(self, htmls):
+        self.batches.append(len(htmls))
+        return [(html.encode('utf-8'), None) for html in htmls]
+
+
+def test_batcher_renders_in_batches():
+    renderer = EchoRenderer()
+    batcher = PdfBatcher(renderer, batch_size=3, max_wait=0.5)
+    results = []
+    for i in range(5):
+        batcher.submit(f'report {i}', lambda pdf, error: results.append(pdf))
+    batcher.close()
+    assert sorted(results) == [f'report {i}'.encode('utf-8') for i in range(5)]
+    assert renderer.batches[0] == 3
+
+def test_batcher_survives_a_failing_callback():
+    batcher = PdfBatcher(EchoRenderer(), batch_size=2, max_wait=0.1)
+    results = []
+
+    def broken(pdf, error):
+        raise OSError('disk full')
+
+    batcher.submit('first', broken)
+    batcher.submit('second', lambda pdf, error: results.append(pdf))
+    batcher.submit('third', lambda pdf, error: results.append(pdf))
+    batcher.close()
+    assert results == [b'second', b'third']
+
+
+def test_cache_evicts_the_oldest_files(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=25)
+    for age, key in enumerate(('a', 'b'), 1):
+        cache.put(key, b'x' * 10)
+        os.utime(cache.path(key), (age, age))
+    # Reading a report makes it the most recently used
+    cache.get('a')
+    cache.put('c', b'x' * 10)
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.get('b') is None
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        resolve_backend('latex')
+
+def test_render_is_cached(tmp_path):
+    pytest.importorskip('xhtml2pdf')
+    renderer = PdfRenderer('xhtml2pdf', max_workers=1, cache=PdfCache(str(tmp_path)))
+    try:
+        html = '<html><body><h1>Report</h1></body></html>'
+        pdf = renderer.render(html)
+        assert pdf.startswith(b'%PDF')
+        assert renderer.render_many([html]) == [(pdf, None)]
+    finally:
+        renderer.close()
@@ -0,0 +1,85 @@
+import contextvars
+import threading
+
+import pytest
+
+from pipeline import StagePipeline
+
+
+def run(pipeline):
+    return list(pipeline.run())
+
+
+def test_stages_get_their_inputs():
+    pipeline = StagePipeline()
+    pipeline.add('a', lambda: 2)
+    pipeline.add('b', lambda a: a * 3, ['a'])
+    pipeline.add('c', lambda a, b: a + b, ['a', 'b'])
+    events = run(pipeline)
+    assert ('done', 'c', 8) in events
+    assert set(pipeline.timings) == {'a', 'b', 'c'}
+
+def test_unknown_dependency():
+    pipeline = StagePipeline()
+    with pytest.raises(ValueError):
+        pipeline.add('b', lambda a: a, ['a'])
+
+def test_failure_fails_everything_downstream():
+    def broken():
+        raise KeyError('missing')
+
+    pipeline = StagePipeline()
+    pipeline.add('a', broken)
+    pipeline.add('b', lambda a: a, ['a'])
+    pipeline.add('c', lambda b: b, ['b'])
+    pipeline.add('other', lambda: 'ok')
+    events = run(pipeline)
+
+    failed = {name: value for kind, name, value in events if kind == 'failed'}
+    assert set(failed) == {'a', 'b', 'c'}
+    assert isinstance(failed['a'], KeyError)
+    assert str(failed['b']) == "Stage 'a' failed"
+    assert str(failed['c']) == "Stage 'b' failed"
+    assert ('done', 'other', 'ok') in events
+    # Downstream failures are reported after the failure that caused them
+    names = [name for kind, name, _ in events if kind == 'failed']
+    assert names == ['a', 'b', 'c']
+
+def test_partial_results_are_yielded():
+    pipeline = StagePipeline()
+
+    def stage():
+        pipeline.emit('a', 'half')
+        return 'all'
+
+    pipeline.add('a', stage)
+    assert run(pipeline) == [('partial', 'a', 'half'), ('done', 'a', 'all')]
+
+def test_closing_the_run_cancels_stages_not_started():
+    started = []
+    release = threading.Event()
+
+    pipeline = StagePipeline(max_workers=1)
+
+    def slow(a):
+        pipeline.emit('b', 'running')
+        release.wait(5)
+        return 1
+
+    pipeline.add('a', lambda: 'first')
+    pipeline.add('b', slow, ['a'])
+    pipeline.add('c', lambda a: started.append('c'), ['a'])
+    events = pipeline.run()
+    assert next(events) == ('done', 'a', 'first')
+    # 'c' is now waiting for the only worker
+    assert next(events) == ('partial', 'b', 'running')
+    events.close()
+    release.set()
+    assert started == []
+
+def test_stages_see_the_callers_context():
+    var = contextvars.ContextVar('var', default=None)
+    var.set('caller')
+    pipeline = StagePipeline()
+    pipeline.add('a', var.get)
+    assert run(pipeline) == [('done', 'a', 'caller')]
@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+import scraper
+from conftest import html_page
+from scrape_cache import ScrapeCache
+from scraper import fetch_site_data, make_session
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ScrapeCache(str(tmp_path))
+
+# Session that records the status of every response it gets
+@pytest.fixture
+def session():
+    with make_session() as session:
+        session.statuses = []
+        session.hooks['response'].append(lambda response, *args, **kwargs: session.statuses.append(response.status_code))
+        yield session
+
+
+def test_unchanged_page_is_revalidated(page_server, cache, session):
+    server = page_server({'index.html': html_page('Shop', '<h1>Shop</h1><p>Buy things here.</p>')})
+    url = server.url + 'index.html'
+    first = fetch_site_data(url, session, cache)
+    again = fetch_site_data(url, session, cache)
+    assert session.statuses == [200, 304]
+    assert again == first
+
+    server.pages['index.html'] = html_page('Shop', '<h1>New shop</h1>')
+    changed = fetch_site_data(url, session, cache)
+    assert session.statuses[-1] == 200
+    assert changed['headers'] == ['New shop']
+    assert cache.get(url)['data'] == changed
+
+def test_size_counts_the_body_and_the_data(page_server, cache, session):
+    server = page_server({'index.html': html_page('Shop', '<p>Buy things here.</p>' * 200)})
+    url = server.url + 'index.html'
+    data = fetch_site_data(url, session, cache)
+    entry = cache.get(url)
+    assert 0 < entry['body_size'] == os.path.getsize(cache.body_path(entry['body_hash']))
+    size = cache._db().execute('SELECT size FROM pages WHERE url = ?', (url,)).fetchone()[0]
+    assert size == entry['body_size'] + len(json.dumps(data))
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = ScrapeCache(str(tmp_path), max_bytes=2500)
+    page = {'content': 'x' * 1000}
+    cache.put('http://a.test/', page)
+    cache.put('http://b.test/', page)
+    cache.touch('http://a.test/')
+    # Data alone pushes the cache over its limit, with no bodies stored
+    cache.put('http://c.test/', page)
+    assert cache.get('http://b.test/') is None
+    assert cache.get('http://a.test/') and cache.get('http://c.test/')
+
+def test_eviction_drops_expired_entries(tmp_path):
+    cache = ScrapeCache(str(tmp_path), max_bytes=100, ttl=0)
+    cache.put('http://a.test/', {'content': 'x' * 200})
+    assert cache._db().execute('SELECT COUNT(*) FROM pages').fetchone()[0] == 0
+
+
+def test_stale_extraction_is_redone_from_the_stored_body(page_server, cache, session, monkeypatch):
+    server = page_server({'index.html': html_page('Shop', '<h1>Shop</h1><p>Buy things here.</p>')})
+    url = server.url + 'index.html'
+    first = fetch_site_data(url, session, cache)
+    # As if an older extractor had produced a different title
+    cache._db().execute('UPDATE pages SET data = ? WHERE url = ?', (json.dumps(dict(first, title='old')), url))
+
+    monkeypatch.setattr(scraper, 'EXTRACTOR_VERSION', scraper.EXTRACTOR_VERSION + 1)
+    again = fetch_site_data(url, session, cache)
+    assert session.statuses == [200, 304]
+    assert again == first
+    entry = cache.get(url)
+    assert entry['data'] == first
+    assert entry['data_version'] == scraper.EXTRACTOR_VERSION
+
+def test_stale_extraction_without_a_body_is_fetched_again(page_server, cache, session, monkeypatch):
+    server = page_server({'index.html': html_page('Shop', '<h1>Shop</h1>')})
+    url = server.url + 'index.html'
+    first = fetch_site_data(url, session, cache)
+    os.remove(cache.body_path(cache.get(url)['body_hash']))
+
+    monkeypatch.setattr(scraper, 'EXTRACTOR_VERSION', scraper.EXTRACTOR_VERSION + 1)
+    assert fetch_site_data(url, session, cache) == first
+    assert session.statuses == [200, 200]
+    assert cache.has_body(cache.get(url))
@@ -0,0 +1,82 @@
+from conftest import html_page
+from scraper import detect_encoding, extract_page, fetch_site_data
+
+
+def pieces(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_detect_encoding():
+    assert detect_encoding('text/html; charset=ISO-8859-1', b'') == 'iso8859-1'
+    assert detect_encoding('text/html', b'<html><head><meta charset="windows-1252">') == 'cp1252'
+    assert detect_encoding(None, b'<meta http-equiv="Content-Type" content="text/html; charset=latin-1">') == 'iso8859-1'
+    # The header wins over the page, and unknown names fall back to UTF-8
+    assert detect_encoding('text/html; charset=utf-8', b'<meta charset="windows-1252">') == 'utf-8'
+    assert detect_encoding('text/html; charset=bogus', b'') == 'utf-8'
+
+def test_meta_charset_decodes_the_page():
+    page = '<html><head><meta charset="windows-1252"><title>Café</title></head><body><p>Crème brûlée</p></body></html>'
+    data = extract_page(pieces(page.encode('cp1252'), 7))
+    assert data['title'] == 'Café'
+    assert data['content'] == 'Café\nCrème brûlée'
+
+def test_multibyte_characters_split_across_chunks():
+    page = '<p>Ünïcödé</p><p>日本語のテキスト</p>'.encode('utf-8')
+    data = extract_page(pieces(page, 5), 'text/html; charset=utf-8')
+    assert data['content'] == 'Ünïcödé\n日本語のテキスト'
+
+
+def test_byte_cap_truncates_the_page():
+    page = html_page('Long', '<p>word </p>' * 1000)
+    data = extract_page(pieces(page, 100), max_bytes=500)
+    assert data['truncated'] and data['html_bytes'] == 500
+    assert data['title'] == 'Long'
+
+    full = extract_page([page])
+    assert not full['truncated'] and full['html_bytes'] == len(page)
+
+def test_text_cap_limits_the_content():
+    data = extract_page([html_page('Long', '<p>' + 'x' * 5000 + '</p><h2>Late heading</h2>')], max_text_chars=100)
+    assert len(data['content']) <= 100
+    # Tags past the cap are still seen
+    assert data['headers'] == ['Late heading']
+
+
+def test_scripts_and_styles_are_not_text():
+    page = (
+        '<script src="/app.js"></script><script>var hidden = "<p>no</p>";</script>'
+        '<style>p { color: red }</style><template><p>later</p></template>'
+        '<link rel="stylesheet" href="/site.css"><link rel="preload" as="font" href="/f.woff2">'
+        '<p>Visible</p>'
+    ).encode('utf-8')
+    data = extract_page([page])
+    assert data['content'] == 'Visible'
+    assert data['assets'] == [
+        {'url': '/app.js', 'type': 'script'},
+        {'url': '/site.css', 'type': 'stylesheet'},
+        {'url': '/f.woff2', 'type': 'font'},
+    ]
+
+def test_headings_and_blocks_break_lines():
+    data = extract_page([b'<h1>Shop</h1><p>one</p><p>two</p><h2>More</h2>text'])
+    assert data['headers'] == ['Shop', 'More']
+    assert data['header_types'] == ['h1', 'h2']
+    assert data['content'] == 'Shop\n\none\ntwo\nMore\ntext'
+    assert data['sections'] == [
+        {'heading': 'Shop', 'level': 'h1', 'text': 'one two'},
+        {'heading': 'More', 'level': 'h2', 'text': 'text'},
+    ]
+
+
+def test_fetch_site_data(page_server):
+    server = page_server({'index.html': html_page('Shop', (
+        '<h1>Shop</h1><h1>Again</h1><h2>Delivery</h2><p>Free delivery on every order.</p>'
+        '<img src="/a.png" alt="A spade"><img src="/b.png"><a href="/about.html">About</a>'
+    ))})
+    data = fetch_site_data(server.url + 'index.html')
+    assert data['status_code'] == 200
+    assert data['final_url'] == server.url + 'index.html'
+    assert data['h1_count'] == 2
+    assert data['image_count'] == 2 and data['alt_text_coverage'] == 0.5
+    assert data['link_count'] == 1
+    assert data['word_count'] == len(data['content'].split())
@@ -0,0 +1,109 @@
+import site_crawler
+from conftest import html_page
+from site_crawler import SiteAggregator, SiteCrawler, normalize_url
+
+
+def links(*hrefs):
+    return ''.join(f'<a href="{href}">{href}</a>' for href in hrefs)
+
+def fake_page(title='Page', links=(), final_url=None):
+    return {
+        'title': title, 'meta_description': 'About', 'links': list(links), 'final_url': final_url,
+        'word_count': 10, 'h1_count': 1, 'images': [], 'image_count': 0, 'link_count': len(links),
+        'alt_text_coverage': 0,
+    }
+
+# Crawler over a dict of pages instead of the network
+class FakeCrawler(SiteCrawler):
+    def __init__(self, start_url, pages, **options):
+        super().__init__(start_url, use_sitemap=False, respect_robots=False, requests_per_second=0, **options)
+        self.pages = pages
+        self.fetched = []
+
+    def _fetch(self, url):
+        self.fetched.append(url)
+        return self.pages[url]
+
+def crawl(server, path='', **options):
+    crawler = SiteCrawler(server.url + path, requests_per_second=0, **options)
+    records = list(crawler.crawl())
+    return crawler, records, crawler.summary()
+
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Example.COM:80//a//b?z=1&a=2#top') == 'http://example.com/a/b?a=2&z=1'
+    assert normalize_url('https://example.com:8443') == 'https://example.com:8443/'
+    assert normalize_url('../c', 'https://example.com/a/b/') == 'https://example.com/a/c'
+    assert normalize_url('mailto:someone@example.com') is None
+    assert normalize_url('/relative') is None
+
+
+def test_scheme_and_www_spellings_are_fetched_once():
+    canonical = 'https://www.example.test/'
+    crawler = FakeCrawler('http://example.test/', {
+        'http://example.test/': fake_page(final_url=canonical, links=[
+            'http://example.test/about', 'https://www.example.test/about', 'http://www.example.test/',
+            '//example.test/about?b=2&a=1', 'https://other.test/',
+        ]),
+        canonical + 'about': fake_page(links=['http://example.test/', canonical]),
+        canonical + 'about?a=1&b=2': fake_page(),
+    })
+    list(crawler.crawl())
+    assert crawler.fetched == ['http://example.test/', canonical + 'about', canonical + 'about?a=1&b=2']
+
+def test_links_resolve_against_the_final_url(page_server):
+    server = page_server({
+        'shop/index.html': html_page('Shop', links('item.html')),
+        'shop/item.html': html_page('Item', links('../shop/index.html')),
+    }, redirects={'': '/shop/index.html'})
+    _, records, summary = crawl(server)
+    assert [r['url'] for r in records] == [server.url, server.url + 'shop/item.html']
+    assert summary['errors'] == 0
+
+def test_robots_disallowed_pages_are_skipped(page_server):
+    server = page_server({
+        'robots.txt': b'User-agent: *\nDisallow: /private/\n',
+        'index.html': html_page('Home', links('private/a.html', 'public.html')),
+        'public.html': html_page('Public', ''),
+        'private/a.html': html_page('Private', ''),
+    })
+    _, records, summary = crawl(server, 'index.html')
+    assert sorted(r['url'] for r in records) == [server.url + 'index.html', server.url + 'public.html']
+    assert summary['blocked_by_robots'] == 1
+
+def test_page_budget_marks_the_crawl_incomplete(page_server):
+    pages = {f'p{i}.html': html_page(f'Page {i}', '') for i in range(10)}
+    pages['index.html'] = html_page('Home', links(*pages))
+    server = page_server(pages)
+    crawler, records, summary = crawl(server, 'index.html', max_pages=4)
+    assert len(records) == summary['pages_crawled'] == 4
+    assert crawler.truncated
+    assert summary['crawl_complete'] is False and summary['orphan_pages'] is None
+
+def test_sitemap_pages_without_links_are_orphans(page_server):
+    server = page_server({
+        'index.html': html_page('Home', links('a.html')),
+        'a.html': html_page('A', ''),
+        'lonely.html': html_page('Lonely', ''),
+    })
+    server.pages['sitemap.xml'] = (
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f'<url><loc>{server.url}a.html</loc></url><url><loc>{server.url}lonely.html</loc></url></urlset>'
+    ).encode('utf-8')
+    _, records, summary = crawl(server, 'index.html')
+    assert len(records) == 3
+    assert summary['sitemap_urls'] == 2
+    assert summary['orphan_pages'] == 1
+    assert summary['unlinked_samples'] == [server.url + 'lonely.html']
+
+
+def test_title_samples_are_bounded(monkeypatch):
+    monkeypatch.setattr(site_crawler, 'TITLE_SAMPLE_POOL', 2)
+    aggregator = SiteAggregator()
+    for i, title in enumerate(['A', 'B', 'C', 'C', 'D', 'D', 'D']):
+        aggregator.add_page(f'http://example.test/{i}', fake_page(title))
+    assert len(aggregator.title_samples) == 2
+
+    summary = aggregator.summary()
+    assert summary['duplicate_title_groups'] == 2
+    assert [(d['title'], d['count']) for d in summary['duplicate_titles']] == [('D', 3), ('C', 2)]
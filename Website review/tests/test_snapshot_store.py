@@ -0,0 +1,70 @@
+import pytest
+
+from snapshot_store import SnapshotStore, diff_sections
+
+
+def section(heading, fingerprint, kind='section'):
+    return {'kind': kind, 'heading': heading, 'fingerprint': fingerprint}
+
+def site(url, sections):
+    return {
+        'url': url, 'title': 'Shop', 'meta_description': 'About the shop',
+        'sections': [{'heading': h, 'level': 'h2', 'text': t} for h, t in sections],
+        'images': [], 'links': [],
+    }
+
+def scores(value):
+    return {'performance': value, 'seo': value, 'ux': value, 'content': value, 'security': value}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / 'history.sqlite3'))
+
+
+def test_diff_sections():
+    old = [section('Intro', 'a'), section('Pricing', 'b'), section('FAQ', 'c')]
+    new = [section('Intro', 'a'), section('Pricing', 'B'), section('Contact', 'd')]
+    assert diff_sections(old, new) == {
+        'changed': ['Pricing'], 'added': ['Contact'], 'removed': ['FAQ'], 'unchanged': 1,
+    }
+
+def test_diff_sections_ignores_moves_and_matches_repeated_headings_in_order():
+    old = [section('Features', 'a'), section('Intro', 'b'), section('Features', 'c')]
+    new = [section('Intro', 'b'), section('Features', 'a'), section('Features', 'C')]
+    assert diff_sections(old, new) == {'changed': ['Features'], 'added': [], 'removed': [], 'unchanged': 2}
+
+def test_diff_sections_tells_kinds_apart():
+    diff = diff_sections([section('Images', 'a', kind='images')], [section('Images', 'a')])
+    assert diff['added'] == ['Images'] and diff['removed'] == ['Images']
+
+
+def test_save_snapshot_diffs_against_the_previous_audit(store):
+    first = store.save_snapshot(site('http://a.test/', [('Intro', 'hello'), ('Pricing', 'cheap')]), scores(50))
+    assert first['diff'] is None
+
+    second = store.save_snapshot(site('http://a.test/', [('Intro', 'hello'), ('Pricing', 'cheaper')]), scores(60))
+    assert second['diff']['changed'] == ['H2 Pricing']
+    assert second['diff']['unchanged'] == 1
+    assert store.latest_snapshot('http://a.test/')['id'] == second['id']
+
+def test_score_history(store):
+    for value in (40, 50, 60):
+        store.save_snapshot(site('http://a.test/', [('Intro', str(value))]), scores(value))
+    assert store.score_history('http://b.test/') == []
+
+    history = store.score_history('http://a.test/')
+    assert [row['seo'] for row in history] == [40, 50, 60]
+    assert history[0]['created_at'] <= history[1]['created_at'] <= history[2]['created_at']
+    # The most recent audits, still oldest first
+    assert [row['seo'] for row in store.score_history('http://a.test/', limit=2)] == [50, 60]
+    since = history[1]['created_at']
+    assert store.score_history('http://a.test/', since=since) == [row for row in history if row['created_at'] >= since]
+
+def test_latest_analysis_keeps_the_newest(store):
+    for i in range(5):
+        store.save_analysis('http://a.test/', 'fake', 2, f'fp{i}', f'text {i}', [{'findings': str(i)}])
+    latest = store.latest_analysis('http://a.test/', 'fake', 2)
+    assert latest['text'] == 'text 4'
+    assert latest['chunks'] == [{'findings': '4'}]
+    assert store.latest_analysis('http://a.test/', 'fake', 3) is None
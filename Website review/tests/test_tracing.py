@@ -0,0 +1,95 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+from tracing import NOOP_SPAN, Tracer, current_rss_bytes, traced
+
+
+def test_disabled_tracer_records_nothing():
+    t = Tracer(enabled=False)
+    with t.span('scrape') as span:
+        span.add('bytes', 10)
+    assert span is NOOP_SPAN
+    assert t.spans() == [] and t.totals == {}
+
+def test_override_applies_to_the_calling_context_only():
+    t = Tracer(enabled=False)
+    other = []
+    with t.override(True):
+        assert t.active()
+        # A new thread starts from an empty context, as another session's would
+        thread = threading.Thread(target=lambda: other.append(t.active()))
+        thread.start()
+        thread.join()
+        with t.span('audit'):
+            pass
+    assert other == [False]
+    assert not t.active()
+    assert [span.name for span in t.spans()] == ['audit']
+
+    t.enable()
+    with t.override(False):
+        assert t.span('audit') is NOOP_SPAN
+
+def test_spans_nest_into_one_trace():
+    t = Tracer(enabled=True)
+    with t.span('audit', url='http://example.test/') as root:
+        with t.span('scrape') as scrape:
+            scrape.add('bytes', 100)
+            scrape.record('scrape.parse', 0.5, bytes=100)
+    parse, scrape, audit = t.spans()
+    assert {span.trace_id for span in (parse, scrape, audit)} == {root.trace_id}
+    assert parse.parent_id == scrape.span_id and scrape.parent_id == audit.span_id
+    assert parse.seconds == 0.5 and parse.rss_delta is None
+
+    lines = [json.loads(line) for line in t.jsonl(root.trace_id).splitlines()]
+    assert [line['name'] for line in lines] == ['scrape.parse', 'scrape', 'audit']
+    assert lines[1]['counters'] == {'bytes': 100}
+    assert lines[2]['attrs'] == {'url': 'http://example.test/'}
+
+@pytest.mark.skipif(current_rss_bytes() is None, reason="needs /proc/self/statm")
+def test_rss_delta_is_measured_from_the_span_start():
+    t = Tracer(enabled=True)
+    # Raise the process's lifetime peak first; the span's figure mustn't depend on it
+    peak = bytearray(96 * 1024 * 1024)
+    del peak
+    with t.span('alloc') as span:
+        kept = bytearray(48 * 1024 * 1024)
+    assert span.rss_delta > 32 * 1024 * 1024
+    assert span.to_dict()['rss_delta_bytes'] == span.rss_delta
+    del kept
+
+
+def test_prometheus_output():
+    t = Tracer(enabled=True)
+    for seconds in (0.003, 0.2):
+        t.span('scrape').record('scrape.parse', seconds, bytes=10)
+    with pytest.raises(ValueError):
+        with t.span('report'):
+            raise ValueError('boom')
+
+    lines = t.prometheus().splitlines()
+    assert 'cro_span_duration_seconds_bucket{span="scrape.parse",le="0.005"} 1' in lines
+    assert 'cro_span_duration_seconds_bucket{span="scrape.parse",le="0.25"} 2' in lines
+    assert 'cro_span_duration_seconds_bucket{span="scrape.parse",le="+Inf"} 2' in lines
+    assert 'cro_span_duration_seconds_count{span="scrape.parse"} 2' in lines
+    assert 'cro_span_counter_total{span="scrape.parse",counter="bytes"} 20' in lines
+    assert 'cro_span_errors_total{span="report"} 1' in lines
+    assert any(line.startswith('cro_process_max_rss_bytes ') for line in lines)
+
+
+def test_traced_counts_bytes_and_flags_none(monkeypatch):
+    t = Tracer(enabled=True)
+    monkeypatch.setattr(tracing, 'tracer', t)
+
+    @traced('report')
+    def report(text):
+        return text
+
+    assert report('hé') == 'hé'
+    assert report(None) is None
+    ok, failed = t.spans()
+    assert ok.counters == {'bytes': 3} and ok.status == 'ok'
+    assert failed.status == 'error'
@@ -0,0 +1,285 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage; the peak RSS gauge reads 0
+    resource = None
+
+# Lightweight tracing for the audit stages.
+#
+#   with tracer.span('scrape', url=url) as span:
+#       ...
+#       span.add('bytes', len(body))
+#
+# Spans nest through a context variable (StagePipeline copies it into its
+# worker threads) and share the trace id of the outermost span, so one audit
+# is one trace. Each span records its wall time, numeric counters (bytes,
+# tokens, ...), free-form attributes and how much the process's resident
+# memory changed while it ran (read from /proc/self/statm at start and end;
+# on other platforms it's left out). Resident memory is shared by all
+# threads, so concurrent stages show in each other's figures. Finished spans
+# are kept in a ring buffer for the Streamlit panel, aggregated for
+# Prometheus, and appended to CRO_TRACE_FILE as JSON lines.
+#
+# Tracing is off unless CRO_TRACING=1 (or tracer.enable() is called); while
+# it's off, span() returns one shared no-op object and nothing is recorded.
+# tracer.override() turns it on or off for the calling context only, e.g. one
+# Streamlit session's audit, without affecting other sessions.
+
+TRACING = os.getenv('CRO_TRACING', '') not in ('', '0')
+TRACE_FILE = os.getenv('CRO_TRACE_FILE')
+MAX_SPANS = int(os.getenv('CRO_TRACE_SPANS', '5000'))
+# Upper bounds of the Prometheus duration histogram, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar('cro_span', default=None)
+# Per-context tracing setting from Tracer.override(); None follows the tracer
+_override = contextvars.ContextVar('cro_tracing', default=None)
+
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+
+# Current resident set size of this process, or None without /proc
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+# Peak resident set size of this process so far
+def max_rss_bytes():
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Span:
+    def __init__(self, tracer, name, parent, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.attrs = attrs
+        self.counters = {}
+        self.status = 'ok'
+        self.error = None
+        self.seconds = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._rss_start = current_rss_bytes()
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, counter, amount):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    # Records an already-measured sub-step (e.g. the parse time inside a
+    # streamed download) as a finished child of this span
+    def record(self, name, seconds, **counters):
+        child = Span(self.tracer, name, self, {})
+        child.counters = counters
+        child.seconds = seconds
+        child.start_time = time.time() - seconds
+        # Measured after the fact, so its memory change is unknown
+        child._rss_start = None
+        self.tracer._finish(child)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        if exc is not None:
+            self.status = 'error'
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': round(self.start_time, 6),
+            'seconds': round(self.seconds, 6),
+            'status': self.status,
+            'error': self.error,
+            'counters': self.counters,
+            'attrs': self.attrs,
+            'rss_bytes': self.rss,
+            'rss_delta_bytes': self.rss_delta,
+        }
+
+
+class NoopSpan:
+    trace_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, counter, amount):
+        pass
+
+    def record(self, name, seconds, **counters):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    def __init__(self, enabled=TRACING, trace_file=TRACE_FILE, max_spans=MAX_SPANS):
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=max_spans)
+        # span name -> {'count', 'errors', 'seconds', 'buckets', 'counters'}
+        self.totals = {}
+
+    def enable(self, trace_file=None):
+        self.enabled = True
+        if trace_file:
+            self.trace_file = trace_file
+
+    # Whether spans started in the calling context are recorded
+    def active(self):
+        override = _override.get()
+        return self.enabled if override is None else override
+
+    # Turns tracing on or off for code run in this context (and the stage
+    # threads StagePipeline starts from it), leaving other contexts alone
+    @contextlib.contextmanager
+    def override(self, enabled):
+        token = _override.set(enabled)
+        try:
+            yield
+        finally:
+            _override.reset(token)
+
+    def span(self, name, **attrs):
+        if not self.active():
+            return NOOP_SPAN
+        return Span(self, name, _current.get(), attrs)
+
+    # The span the calling code is running in, or a no-op
+    def current(self):
+        return _current.get() or NOOP_SPAN
+
+    def _finish(self, span):
+        span.rss = current_rss_bytes() if span._rss_start is not None else None
+        span.rss_delta = span.rss - span._rss_start if span.rss is not None else None
+        line = json.dumps(span.to_dict(), default=str) if self.trace_file else None
+        with self.lock:
+            self.recent.append(span)
+            total = self.totals.get(span.name)
+            if total is None:
+                total = self.totals[span.name] = {
+                    'count': 0, 'errors': 0, 'seconds': 0.0,
+                    'buckets': [0] * len(DURATION_BUCKETS), 'counters': {},
+                }
+            total['count'] += 1
+            total['errors'] += span.status != 'ok'
+            total['seconds'] += span.seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.seconds <= bound:
+                    total['buckets'][i] += 1
+            for counter, amount in span.counters.items():
+                total['counters'][counter] = total['counters'].get(counter, 0) + amount
+            if line:
+                with open(self.trace_file, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+
+    # Finished spans, oldest first; only those of one trace if trace_id is given
+    def spans(self, trace_id=None):
+        with self.lock:
+            spans = list(self.recent)
+        return [span for span in spans if trace_id is None or span.trace_id == trace_id]
+
+    def jsonl(self, trace_id=None):
+        return ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in self.spans(trace_id))
+
+    # All spans since startup in the Prometheus text exposition format
+    def prometheus(self):
+        with self.lock:
+            totals = {name: dict(t, buckets=list(t['buckets']), counters=dict(t['counters'])) for name, t in self.totals.items()}
+        lines = [
+            '# HELP cro_span_duration_seconds Wall time of traced audit stages.',
+            '# TYPE cro_span_duration_seconds histogram',
+        ]
+        for name, total in sorted(totals.items()):
+            for bound, count in zip(DURATION_BUCKETS, total['buckets']):
+                lines.append(f'cro_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'cro_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {total["count"]}')
+            lines.append(f'cro_span_duration_seconds_sum{{span="{name}"}} {total["seconds"]:.6f}')
+            lines.append(f'cro_span_duration_seconds_count{{span="{name}"}} {total["count"]}')
+        lines += ['# HELP cro_span_errors_total Traced stages that raised.', '# TYPE cro_span_errors_total counter']
+        for name, total in sorted(totals.items()):
+            lines.append(f'cro_span_errors_total{{span="{name}"}} {total["errors"]}')
+        lines += ['# HELP cro_span_counter_total Bytes, tokens and other amounts recorded by traced stages.',
+                  '# TYPE cro_span_counter_total counter']
+        for name, total in sorted(totals.items()):
+            for counter, amount in sorted(total['counters'].items()):
+                lines.append(f'cro_span_counter_total{{span="{name}",counter="{counter}"}} {amount}')
+        lines += ['# HELP cro_process_max_rss_bytes Peak resident memory of this process.',
+                  '# TYPE cro_process_max_rss_bytes gauge',
+                  f'cro_process_max_rss_bytes {max_rss_bytes()}']
+        rss = current_rss_bytes()
+        if rss is not None:
+            lines += ['# HELP cro_process_resident_bytes Resident memory of this process.',
+                      '# TYPE cro_process_resident_bytes gauge',
+                      f'cro_process_resident_bytes {rss}']
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide tracer; module state survives Streamlit reruns
+tracer = Tracer()
+
+
+# Decorator: run the function in a span named `name`. Returned text/bytes are
+# counted as the span's bytes, and a None result (the app's stages return
+# None after reporting an error) marks the span as failed.
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.active():
+                return fn(*args, **kwargs)
+            with tracer.span(name) as span:
+                result = fn(*args, **kwargs)
+                if isinstance(result, str):
+                    span.add('bytes', len(result.encode('utf-8')))
+                elif isinstance(result, bytes):
+                    span.add('bytes', len(result))
+                elif result is None:
+                    span.status = 'error'
+                return result
+        return wrapper
+    return decorator